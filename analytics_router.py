@@ -0,0 +1,14 @@
+from datetime import date
+from fastapi import APIRouter, Query, Request, Response
+from dtos import fleetAnalyticsReport
+from etag import check_etag
+from analytics_service import get_fleet_analytics
+
+analytics_router = APIRouter()
+
+@analytics_router.get('/', response_model=fleetAnalyticsReport)
+def get_fleet_analytics_report(request: Request, response: Response, startDate: date = Query(...), endDate: date = Query(...)) -> fleetAnalyticsReport:
+    not_modified = check_etag(request, response, 'garage', 'maintenance')
+    if not_modified:
+        return not_modified
+    return get_fleet_analytics(startDate, endDate)
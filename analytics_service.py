@@ -0,0 +1,167 @@
+import glob
+import hashlib
+import os
+from datetime import date, timedelta
+import numpy as np
+from database import Session
+from dtos import cityLoadStats, fleetAnalyticsReport, serviceTypeShare
+from model import Garage, Maintenance
+from sqlalchemy import String, func, select, true, type_coerce
+from fastapi import HTTPException
+
+ANALYTICS_CACHE_DIR = os.getenv('ANALYTICS_CACHE_DIR')
+ANALYTICS_CACHE_ENTRIES = int(os.getenv('ANALYTICS_CACHE_ENTRIES', 32))
+MAX_ANALYTICS_DAYS = 3660
+PERCENTILES = [50, 90, 99]
+
+def get_fleet_analytics(startDate: date, endDate: date) -> fleetAnalyticsReport:
+    if endDate < startDate:
+        raise HTTPException(status_code=400, detail="End date should not be before start date")
+    if (endDate - startDate).days >= MAX_ANALYTICS_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range should not exceed {MAX_ANALYTICS_DAYS} days")
+
+    frames = load_frames(startDate, endDate)
+    return build_fleet_analytics(frames, startDate, endDate)
+
+def load_frames(startDate: date, endDate: date) -> dict[str, np.ndarray]:
+    if not ANALYTICS_CACHE_DIR:
+        return fetch_frames(startDate, endDate)
+
+    key = frames_cache_key(startDate, endDate)
+    path = os.path.join(ANALYTICS_CACHE_DIR, f'analytics-{key}.npz')
+    try:
+        with np.load(path) as cached:
+            frames = dict(cached)
+        os.utime(path)
+        return frames
+    except FileNotFoundError:
+        pass
+
+    frames = fetch_frames(startDate, endDate)
+    os.makedirs(ANALYTICS_CACHE_DIR, exist_ok=True)
+    partial = f'{path}.{os.getpid()}.tmp'
+    with open(partial, 'wb') as file:
+        np.savez(file, **frames)
+    os.replace(partial, path)
+    prune_frames_cache()
+    return frames
+
+def frames_cache_key(startDate: date, endDate: date) -> str:
+    garages = select(func.count(), func.max(Garage.id), func.max(Garage.updatedAt)).subquery()
+    maintenances = select(func.count(), func.max(Maintenance.id), func.max(Maintenance.updatedAt)).where(
+        Maintenance.garageId.is_not(None),
+        Maintenance.scheduledDate >= startDate,
+        Maintenance.scheduledDate <= endDate
+    ).subquery()
+    with Session() as session:
+        watermarks = session.execute(select(garages, maintenances).select_from(garages.join(maintenances, true()))).one()
+        url = session.get_bind().url.render_as_string(hide_password=True)
+    return hashlib.sha1(f'{url}|{startDate}|{endDate}|{tuple(watermarks)}'.encode()).hexdigest()
+
+def prune_frames_cache() -> None:
+    entries = []
+    for path in glob.glob(os.path.join(ANALYTICS_CACHE_DIR, 'analytics-*.npz')):
+        try:
+            entries.append((os.stat(path).st_mtime, path))
+        except FileNotFoundError:
+            pass
+    for _, path in sorted(entries, reverse=True)[ANALYTICS_CACHE_ENTRIES:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def fetch_frames(startDate: date, endDate: date) -> dict[str, np.ndarray]:
+    with Session() as session:
+        connection = session.connection()
+        garageIds, cities, capacities = columns(connection.execute(
+            select(Garage.id, Garage.city, Garage.capacity).order_by(Garage.id)
+        ), 3)
+        maintenanceGarageIds, scheduledDates, createdAts, serviceTypes = columns(connection.execute(
+            select(
+                Maintenance.garageId,
+                type_coerce(Maintenance.scheduledDate, String),
+                type_coerce(Maintenance.createdAt, String),
+                Maintenance.serviceType
+            ).where(
+                Maintenance.garageId.is_not(None),
+                Maintenance.scheduledDate >= startDate,
+                Maintenance.scheduledDate <= endDate
+            )
+        ), 4)
+
+    cityLabels, cityCodes = factorize(cities)
+    serviceLabels, serviceCodes = factorize(serviceTypes)
+    scheduled = np.array(scheduledDates, dtype='datetime64[D]')
+    created = np.array(createdAts, dtype='datetime64[s]')
+    return {
+        'garage_id': np.array(garageIds, dtype=np.int64),
+        'garage_city': cityCodes,
+        'garage_capacity': np.array(capacities, dtype=np.int64),
+        'city_labels': np.array(cityLabels, dtype=str),
+        'maintenance_garage_id': np.array(maintenanceGarageIds, dtype=np.int64),
+        'maintenance_day': (scheduled - np.datetime64(startDate, 'D')).astype(np.int64),
+        'maintenance_lead_days': (scheduled.astype('datetime64[s]') - created) / np.timedelta64(1, 'D'),
+        'maintenance_service': serviceCodes,
+        'service_labels': np.array(serviceLabels, dtype=str)
+    }
+
+def columns(result, width: int) -> list[list]:
+    rows = result.all()
+    if not rows:
+        return [[] for _ in range(width)]
+    return [list(column) for column in zip(*rows)]
+
+def factorize(values: list) -> tuple[list, np.ndarray]:
+    codes = {value: code for code, value in enumerate(dict.fromkeys(values))}
+    return list(codes), np.fromiter(map(codes.__getitem__, values), dtype=np.int64, count=len(values))
+
+def build_fleet_analytics(frames: dict[str, np.ndarray], startDate: date, endDate: date) -> fleetAnalyticsReport:
+    days = (endDate - startDate).days + 1
+    garageIds = frames['garage_id']
+    garageIndex = np.searchsorted(garageIds, frames['maintenance_garage_id'])
+    known = garageIndex < len(garageIds)
+    known[known] = garageIds[garageIndex[known]] == frames['maintenance_garage_id'][known]
+
+    loads = np.bincount(
+        garageIndex[known] * days + frames['maintenance_day'][known],
+        minlength=len(garageIds) * days
+    ).reshape(len(garageIds), days)
+    utilization = loads / np.maximum(frames['garage_capacity'], 1)[:, None]
+
+    cities = []
+    for code, city in enumerate(frames['city_labels']):
+        inCity = frames['garage_city'] == code
+        cityLoads = loads[inCity]
+        daily = cityLoads.sum(axis=0)
+        p50, p90, p99 = np.percentile(utilization[inCity], PERCENTILES)
+        peak = int(daily.argmax())
+        cities.append(cityLoadStats(
+            city=str(city),
+            garages=int(inCity.sum()),
+            requests=int(daily.sum()),
+            p50Utilization=round(float(p50), 4),
+            p90Utilization=round(float(p90), 4),
+            p99Utilization=round(float(p99), 4),
+            peakDay=startDate + timedelta(days=peak),
+            peakRequests=int(daily[peak])
+        ))
+
+    requests = int(known.sum())
+    serviceCounts = np.bincount(frames['maintenance_service'][known], minlength=len(frames['service_labels']))
+    serviceTypes = [
+        serviceTypeShare(serviceType=str(frames['service_labels'][code]), requests=int(serviceCounts[code]), share=round(float(serviceCounts[code]) / requests, 4))
+        for code in np.argsort(-serviceCounts, kind='stable') if serviceCounts[code]
+    ]
+
+    leadDays = frames['maintenance_lead_days'][known]
+    leadDays = leadDays[~np.isnan(leadDays)]
+
+    return fleetAnalyticsReport(
+        startDate=startDate,
+        endDate=endDate,
+        requests=requests,
+        averageLeadTimeDays=round(float(leadDays.mean()), 2) if len(leadDays) else None,
+        cities=sorted(cities, key=lambda stats: stats.city),
+        serviceTypes=serviceTypes
+    )
@@ -0,0 +1,264 @@
+import os
+import threading
+from datetime import date, timedelta
+from typing import Optional
+import numpy as np
+from cache import bump_versions
+from database import Session, env_bool
+from invalidation import publish, subscribe
+from model import Garage, Maintenance
+from sqlalchemy import Select, func, select
+from sqlalchemy.orm import Session as ORMSession
+
+AVAILABILITY_INDEX = env_bool('AVAILABILITY_INDEX', False)
+AVAILABILITY_PAST_DAYS = int(os.getenv('AVAILABILITY_PAST_DAYS', 365))
+AVAILABILITY_DAYS = int(os.getenv('AVAILABILITY_DAYS', 3 * 365 + 1))
+SEARCH_WINDOW_DAYS = 64
+MAX_BOOKED = 0xFFFF
+
+
+class GarageSlots:
+    __slots__ = ('id', 'name', 'city', 'capacity', 'row')
+
+    def __init__(self, id: int, name: str, city: str, capacity: int, row: int):
+        self.id = id
+        self.name = name
+        self.city = city
+        self.capacity = capacity
+        self.row = row
+
+
+class AvailabilityIndex:
+    def __init__(self, startDate: date, days: int, rows: int = 16):
+        self.startDate = startDate
+        self.days = days
+        self.booked = np.zeros((max(rows, 1), days), dtype=np.uint16)
+        self.garages: dict[int, GarageSlots] = {}
+        self.cities: dict[str, tuple] = {}
+        self.free_rows: list[int] = []
+        self.next_row = 0
+        self.lock = threading.Lock()
+
+    @property
+    def endDate(self) -> date:
+        return self.startDate + timedelta(days=self.days - 1)
+
+    def covers(self, startDate: date, endDate: date) -> bool:
+        return self.startDate <= startDate and endDate <= self.endDate
+
+    def offset(self, day: date) -> int:
+        return (day - self.startDate).days
+
+    def load(self, session: ORMSession) -> None:
+        garages = session.execute(select(Garage.id, Garage.name, Garage.city, Garage.capacity).order_by(Garage.id)).all()
+        with self.lock:
+            self.booked = np.zeros((max(len(garages), 1), self.days), dtype=np.uint16)
+            self.garages.clear()
+            self.cities.clear()
+            self.free_rows.clear()
+            self.next_row = 0
+            for id, name, city, capacity in garages:
+                self._set_garage(id, name, city, capacity)
+
+            rows = session.execute(select_booked_days(self.startDate, self.endDate)).all()
+            if rows:
+                garageIds, days, requests = zip(*rows)
+                known = np.array([garageId in self.garages for garageId in garageIds])
+                self.booked[
+                    np.array([self.garages[garageId].row for garageId in garageIds if garageId in self.garages], dtype=np.intp),
+                    np.array([self.offset(day) for day in days], dtype=np.intp)[known]
+                ] = np.minimum(np.array(requests, dtype=np.int64)[known], MAX_BOOKED)
+
+    def set_garage(self, id: int, name: str, city: str, capacity: int) -> None:
+        with self.lock:
+            self._set_garage(id, name, city, capacity)
+
+    def _set_garage(self, id: int, name: str, city: str, capacity: int) -> None:
+        slots = self.garages.get(id)
+        if slots is None:
+            self.garages[id] = GarageSlots(id, name, city, capacity, self._allocate_row())
+        else:
+            self.cities.pop(slots.city, None)
+            slots.name, slots.city, slots.capacity = name, city, capacity
+        self.cities.pop(city, None)
+
+    def _allocate_row(self) -> int:
+        if self.free_rows:
+            return self.free_rows.pop()
+        if self.next_row == len(self.booked):
+            grown = np.zeros((len(self.booked) * 2, self.days), dtype=np.uint16)
+            grown[:len(self.booked)] = self.booked
+            self.booked = grown
+        self.next_row += 1
+        return self.next_row - 1
+
+    def remove_garage(self, id: int) -> None:
+        with self.lock:
+            slots = self.garages.pop(id, None)
+            if slots is not None:
+                self.booked[slots.row] = 0
+                self.free_rows.append(slots.row)
+                self.cities.pop(slots.city, None)
+
+    def _city(self, city: str) -> tuple:
+        if city not in self.cities:
+            garages = sorted((slots for slots in self.garages.values() if slots.city == city), key=lambda slots: slots.id)
+            self.cities[city] = (
+                [(slots.id, slots.name, slots.capacity) for slots in garages],
+                np.array([slots.row for slots in garages], dtype=np.intp),
+                np.array([slots.capacity for slots in garages], dtype=np.int32)[:, None]
+            )
+        return self.cities[city]
+
+    def apply(self, deltas: dict[tuple[int, date], int]) -> None:
+        with self.lock:
+            for (garageId, day), delta in deltas.items():
+                slots = self.garages.get(garageId)
+                if slots is None or day is None or not self.covers(day, day):
+                    continue
+                offset = self.offset(day)
+                self.booked[slots.row, offset] = max(0, min(int(self.booked[slots.row, offset]) + delta, MAX_BOOKED))
+
+    def daily_loads(self, garageIds: list[int], startDate: date, endDate: date) -> Optional[tuple[dict[int, GarageSlots], dict[tuple[int, date], int]]]:
+        if not self.covers(startDate, endDate):
+            return None
+        start, end = self.offset(startDate), self.offset(endDate) + 1
+        garages, loads = {}, {}
+        with self.lock:
+            for garageId in garageIds:
+                slots = self.garages.get(garageId)
+                if slots is None:
+                    return None
+                garages[garageId] = slots
+                booked = self.booked[slots.row, start:end]
+                loads.update(((garageId, startDate + timedelta(days=int(offset))), int(booked[offset])) for offset in np.flatnonzero(booked))
+        return garages, loads
+
+    def next_available(self, city: str, count: int, fromDate: date) -> Optional[tuple[list[tuple[int, str, int]], dict[tuple[int, date], int], list[date]]]:
+        if not self.covers(fromDate, fromDate):
+            return None
+        with self.lock:
+            garages, rows, capacity = self._city(city)
+            if not garages:
+                return None
+
+            days, loads = [], {}
+            for start in range(self.offset(fromDate), self.days, SEARCH_WINDOW_DAYS):
+                booked = self.booked[rows, start:start + SEARCH_WINDOW_DAYS]
+                for offset in np.flatnonzero((booked < capacity).any(axis=0))[:count - len(days)]:
+                    day = self.startDate + timedelta(days=start + int(offset))
+                    days.append(day)
+                    column = booked[:, offset]
+                    loads.update(((garages[position][0], day), int(column[position])) for position in np.flatnonzero(column))
+                if len(days) == count:
+                    return garages, loads, days
+        return None
+
+    def diff(self, session: ORMSession) -> list[str]:
+        expected = AvailabilityIndex(self.startDate, self.days)
+        expected.load(session)
+        mismatches = []
+        with self.lock:
+            for garageId in sorted(set(self.garages) | set(expected.garages)):
+                actual, wanted = self.garages.get(garageId), expected.garages.get(garageId)
+                if actual is None or wanted is None:
+                    mismatches.append(f"Garage {garageId} is {'missing from' if actual is None else 'stale in'} the index")
+                    continue
+                if (actual.name, actual.city, actual.capacity) != (wanted.name, wanted.city, wanted.capacity):
+                    mismatches.append(f"Garage {garageId} details differ")
+                for offset in np.flatnonzero(self.booked[actual.row] != expected.booked[wanted.row]):
+                    day = self.startDate + timedelta(days=int(offset))
+                    mismatches.append(f"Garage {garageId} on {day}: index {self.booked[actual.row, offset]}, database {expected.booked[wanted.row, offset]}")
+        return mismatches
+
+    def memory_bytes(self) -> int:
+        return self.booked.nbytes
+
+
+def select_booked_days(startDate: date, endDate: date) -> Select:
+    return select(
+        Maintenance.garageId,
+        Maintenance.scheduledDate,
+        func.count(Maintenance.id)
+    ).where(
+        Maintenance.garageId.is_not(None),
+        Maintenance.scheduledDate >= startDate,
+        Maintenance.scheduledDate <= endDate
+    ).group_by(
+        Maintenance.garageId,
+        Maintenance.scheduledDate
+    )
+
+
+index: Optional[AvailabilityIndex] = None
+
+
+def load_availability_index(today: date = None) -> AvailabilityIndex:
+    global index
+    loaded = AvailabilityIndex((today or date.today()) - timedelta(days=AVAILABILITY_PAST_DAYS), AVAILABILITY_DAYS)
+    with Session() as session:
+        loaded.load(session)
+    index = loaded
+    return loaded
+
+
+def apply_loads(deltas: dict[tuple[int, date], int]) -> None:
+    if index is None:
+        return
+    index.apply(deltas)
+    publish('availability.loads', [[garageId, str(day), delta] for (garageId, day), delta in deltas.items() if delta and day is not None])
+
+
+def set_garage(id: int, name: str, city: str, capacity: int) -> None:
+    if index is None:
+        return
+    index.set_garage(id, name, city, capacity)
+    publish('availability.garage', [[id, name, city, capacity]])
+
+
+def remove_garage(id: int) -> None:
+    if index is None:
+        return
+    index.remove_garage(id)
+    publish('availability.remove', [id])
+
+
+def apply_published_loads(items: list) -> None:
+    if index is not None:
+        index.apply({(garageId, date.fromisoformat(day)): delta for garageId, day, delta in items})
+
+
+def set_published_garages(items: list) -> None:
+    if index is not None:
+        for garage in items:
+            index.set_garage(*garage)
+
+
+def remove_published_garages(items: list) -> None:
+    if index is not None:
+        for id in items:
+            index.remove_garage(id)
+
+
+def reload_published_index(items: list) -> None:
+    if index is not None:
+        load_availability_index()
+        bump_versions('garage', 'maintenance')
+
+
+def daily_loads(garageIds: list[int], startDate: date, endDate: date) -> Optional[tuple[dict[int, GarageSlots], dict[tuple[int, date], int]]]:
+    if index is None:
+        return None
+    return index.daily_loads(garageIds, startDate, endDate)
+
+
+def next_available(city: str, count: int, fromDate: date) -> Optional[tuple[list[tuple[int, str, int]], dict[tuple[int, date], int], list[date]]]:
+    if index is None:
+        return None
+    return index.next_available(city, count, fromDate)
+
+
+subscribe('availability.loads', apply_published_loads)
+subscribe('availability.garage', set_published_garages)
+subscribe('availability.remove', remove_published_garages)
+subscribe('availability.reload', reload_published_index)
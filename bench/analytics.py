@@ -0,0 +1,125 @@
+"""Benchmark the fleet analytics aggregation on a synthetic 1M-maintenance dataset.
+
+Run from the repository root: python -m bench.analytics
+"""
+import glob
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, insert, select
+import analytics_service
+from analytics_service import build_fleet_analytics, fetch_frames, get_fleet_analytics, load_frames
+from bench.common import sqlite_engine, print_table
+from model import Garage, Maintenance
+
+START = date(2024, 1, 1)
+END = date(2024, 12, 31)
+GARAGES = 200
+CITIES = 10
+MAINTENANCES = 1_000_000
+SERVICE_TYPES = ['Oil change', 'Tyre change', 'Inspection', 'Brake service', 'Battery replacement']
+
+
+def seed(engine) -> None:
+    rng = random.Random(7)
+    days = (END - START).days + 1
+    with engine.begin() as connection:
+        connection.execute(insert(Garage), [
+            {'name': f'Garage {i}', 'location': 'Center', 'city': f'City {i % CITIES}', 'capacity': rng.randint(5, 40)}
+            for i in range(GARAGES)
+        ])
+        for _ in range(0, MAINTENANCES, 100_000):
+            rows = []
+            for _ in range(100_000):
+                scheduled = START + timedelta(days=rng.randrange(days))
+                rows.append({
+                    'serviceType': rng.choice(SERVICE_TYPES),
+                    'scheduledDate': scheduled,
+                    'createdAt': datetime.combine(scheduled, datetime.min.time()) - timedelta(hours=rng.randrange(24 * 60)),
+                    'garageId': rng.randint(1, GARAGES)
+                })
+            connection.execute(insert(Maintenance), rows)
+
+
+def verify(engine, report) -> list[str]:
+    errors = []
+    with engine.connect() as connection:
+        services = dict(connection.execute(
+            select(Maintenance.serviceType, func.count()).group_by(Maintenance.serviceType)
+        ).all())
+        cities = dict(connection.execute(
+            select(Garage.city, func.count(Maintenance.id)).join(Garage, Garage.id == Maintenance.garageId).group_by(Garage.city)
+        ).all())
+        peak = report.cities[0]
+        peakRequests = connection.scalar(
+            select(func.count(Maintenance.id)).join(Garage, Garage.id == Maintenance.garageId)
+            .where(Garage.city == peak.city, Maintenance.scheduledDate == peak.peakDay)
+        )
+
+    if report.requests != MAINTENANCES:
+        errors.append(f'requests {report.requests} != {MAINTENANCES}')
+    if {share.serviceType: share.requests for share in report.serviceTypes} != services:
+        errors.append('service type mix does not match GROUP BY serviceType')
+    if {stats.city: stats.requests for stats in report.cities} != cities:
+        errors.append('city totals do not match GROUP BY city')
+    if peak.peakRequests != peakRequests:
+        errors.append(f'{peak.city} peak {peak.peakRequests} != {peakRequests}')
+    if report.averageLeadTimeDays is None or not 29 < report.averageLeadTimeDays < 31:
+        errors.append(f'average lead time {report.averageLeadTimeDays} outside 29-31 days')
+    return errors
+
+
+def check_frames_cache(engine) -> list[str]:
+    errors = []
+    ranges = [(START, START + timedelta(days=30)), (START + timedelta(days=31), START + timedelta(days=61))]
+    before = [load_frames(*dates) for dates in ranges]
+    files = len(glob.glob(os.path.join(analytics_service.ANALYTICS_CACHE_DIR, 'analytics-*.npz')))
+    if files < 3:
+        errors.append(f'frames cache holds {files} entries after three date ranges, ranges evict each other')
+
+    day = ranges[0][0] + timedelta(days=3)
+    with engine.begin() as connection:
+        connection.execute(insert(Maintenance).values(serviceType='Inspection', scheduledDate=day, garageId=1))
+    after = load_frames(*ranges[0])
+    if len(after['maintenance_day']) != len(before[0]['maintenance_day']) + 1:
+        errors.append('frames cache served frames from before a write made outside the API')
+    if len(load_frames(*ranges[1])['maintenance_day']) != len(before[1]['maintenance_day']):
+        errors.append('second date range changed without a write in it')
+    return errors
+
+
+def timed(fn) -> tuple[object, float]:
+    started = time.perf_counter()
+    result = fn()
+    return result, round((time.perf_counter() - started) * 1000, 1)
+
+
+def main() -> int:
+    engine = sqlite_engine()
+    _, seed_ms = timed(lambda: seed(engine))
+
+    frames, fetch_ms = timed(lambda: fetch_frames(START, END))
+    report, aggregate_ms = timed(lambda: build_fleet_analytics(frames, START, END))
+    _, total_ms = timed(lambda: get_fleet_analytics(START, END))
+
+    analytics_service.ANALYTICS_CACHE_DIR = tempfile.mkdtemp(prefix='car-management-analytics-')
+    _, cold_ms = timed(lambda: load_frames(START, END))
+    _, warm_ms = timed(lambda: load_frames(START, END))
+    _, cached_total_ms = timed(lambda: get_fleet_analytics(START, END))
+
+    print_table(
+        ['maintenances', 'seed ms', 'fetch ms', 'aggregate ms', 'uncached ms', 'cache write ms', 'cache read ms', 'cached ms'],
+        [[MAINTENANCES, seed_ms, fetch_ms, aggregate_ms, total_ms, cold_ms, warm_ms, cached_total_ms]]
+    )
+
+    errors = verify(engine, report) + check_frames_cache(engine)
+    for error in errors:
+        print(f'FAILED: {error}')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
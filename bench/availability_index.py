@@ -0,0 +1,124 @@
+"""In-memory availability index: memory footprint, parity with the database paths and consistency after writes.
+
+Run from the repository root: python -m bench.availability_index --garages 10000 --maintenances 300000
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+from fastapi import HTTPException
+import availability
+import database
+from bench.common import sqlite_engine, print_table
+from bench.generator import generate
+from dtos import CreateGarage, CreateMaintenance, UpdateGarage, UpdateMaintenance
+from garage_service import create_garage, delete_garage, get_daily_availability_reports, get_next_available_days, update_garage
+from maintenance_service import create_maintenance, create_maintenances, delete_maintenance, update_maintenance
+
+SAMPLES = 50
+
+
+def median_ms(fn, *args) -> float:
+    timings = []
+    for _ in range(5):
+        started = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(sorted(timings)[2], 3)
+
+
+def with_index(index, fn, *args):
+    availability.index = index
+    try:
+        return fn(*args)
+    finally:
+        availability.index = None
+
+
+def queries(rng: random.Random, dataset) -> list[tuple]:
+    span = (dataset.endDate - dataset.startDate).days
+    calls = []
+    for _ in range(SAMPLES):
+        start = dataset.startDate + timedelta(days=rng.randrange(span - 90))
+        garageIds = rng.sample(dataset.garageIds, 5)
+        calls.append((get_daily_availability_reports, garageIds, start, start + timedelta(days=rng.randint(0, 89))))
+        calls.append((get_next_available_days, rng.choice(dataset.cities), rng.randint(1, 30), start))
+    return calls
+
+
+def write_mix(rng: random.Random, dataset) -> None:
+    def booking():
+        carId = rng.choice(list(dataset.links))
+        day = dataset.startDate + timedelta(days=rng.randrange((dataset.endDate - dataset.startDate).days))
+        return {'carId': carId, 'garageId': rng.choice(dataset.links[carId]), 'serviceType': 'Inspection', 'scheduledDate': day}
+
+    created = [create_maintenance(CreateMaintenance(**booking())).id for _ in range(SAMPLES)]
+    create_maintenances([{**booking(), 'scheduledDate': str(booking()['scheduledDate'])} for _ in range(SAMPLES)])
+    for id in rng.sample(dataset.maintenanceIds, SAMPLES):
+        update_maintenance(id, UpdateMaintenance(**booking()))
+    for id in created[:SAMPLES // 2] + rng.sample(dataset.maintenanceIds, SAMPLES // 2):
+        try:
+            delete_maintenance(id)
+        except HTTPException:
+            pass
+
+    garage = create_garage(CreateGarage(name='Index Garage', location='Bench Street', city=dataset.cities[0], capacity=5))
+    update_garage(garage.id, UpdateGarage(name='Index Garage', location='Bench Street', city=dataset.cities[-1], capacity=7))
+    update_garage(dataset.garageIds[0], UpdateGarage(name='Moved Garage', location='Bench Street', city=dataset.cities[-1], capacity=3))
+    delete_garage(dataset.garageIds[1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Availability index memory, parity and consistency check')
+    parser.add_argument('--garages', type=int, default=10000)
+    parser.add_argument('--cars', type=int, default=40000)
+    parser.add_argument('--maintenances', type=int, default=300000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    engine = sqlite_engine()
+    dataset = generate(engine, args.garages, args.cars, args.maintenances, args.seed)
+    days = (dataset.endDate - dataset.startDate).days + 1
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = availability.AvailabilityIndex(dataset.startDate, days)
+    with database.Session() as session:
+        index.load(session)
+    load_seconds = time.perf_counter() - started
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{len(index.garages)} garages x {days} days loaded in {load_seconds:.2f}s')
+    print(f'booked-count matrix: {index.memory_bytes() / 2 ** 20:.1f} MiB, total allocated: {allocated / 2 ** 20:.1f} MiB')
+
+    failed = False
+    rng = random.Random(args.seed)
+    rows = []
+    for fn, *params in queries(rng, dataset):
+        expected, actual = fn(*params), with_index(index, fn, *params)
+        if expected != actual:
+            print(f'FAILED: {fn.__name__}{tuple(params)} differs between the index and the database')
+            failed = True
+        if len(rows) < 2:
+            rows.append([fn.__name__, median_ms(fn, *params), median_ms(with_index, index, fn, *params)])
+    print_table(['query', 'database ms', 'index ms'], rows)
+
+    availability.index = index
+    try:
+        write_mix(rng, dataset)
+        with database.Session() as session:
+            mismatches = index.diff(session)
+    finally:
+        availability.index = None
+    for mismatch in mismatches[:20]:
+        print(f'FAILED: {mismatch}')
+    failed = failed or bool(mismatches)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
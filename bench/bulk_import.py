@@ -0,0 +1,36 @@
+"""Time POST /cars/bulk style imports of 50k cars at several batch sizes.
+
+Run from the repository root: python -m bench.bulk_import
+"""
+from sqlalchemy import insert
+from bench.common import sqlite_engine, measure, print_table
+from car_service import create_cars
+from model import Garage
+
+CARS = 50000
+GARAGES = 100
+
+
+def main() -> None:
+    rows = []
+    for batchSize in (500, 1000, 5000):
+        engine = sqlite_engine()
+        with engine.begin() as connection:
+            connection.execute(insert(Garage), [
+                {'name': f'Garage {i}', 'location': 'Center', 'city': 'Sofia', 'capacity': CARS}
+                for i in range(GARAGES)
+            ])
+        cars = [
+            {'make': 'Ford', 'model': 'Focus', 'productionYear': 2015, 'licensePlate': f'CA{i:06d}', 'garageIds': [i % GARAGES + 1]}
+            for i in range(CARS)
+        ]
+        results = []
+        result = measure(engine, lambda: results.extend(create_cars(cars, batchSize)), repeat=1)
+        assert sum(result.status == 'created' for result in results) == CARS
+        rows.append([CARS, batchSize, result['statements'], round(result['median_ms'] / 1000, 2)])
+
+    print_table(['cars', 'batch size', 'statements', 'seconds'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Check the entity cache backends: read-through hits, precise invalidation and the read/invalidate race.
+
+The Redis backend runs against bench.fake_redis, an in-process stand-in for the redis-py client.
+
+Run from the repository root: python -m bench.cache_backends
+"""
+import asyncio
+import sys
+import cache
+from bench.common import sqlite_engine
+from bench.fake_redis import FakeAsyncRedis, FakeRedis
+from car_service import create_car, get_car, get_car_async, update_car
+from dtos import CreateCar, UpdateCar
+
+
+def lru_backend():
+    return cache.LRUBackend(maxsize=100, ttl=60)
+
+
+def redis_backend():
+    client = FakeRedis()
+    return cache.RedisBackend(client, FakeAsyncRedis(client), ttl=60)
+
+
+BACKENDS = {'memory': lru_backend, 'redis (fake)': redis_backend}
+
+
+class RacingBackend:
+    def __init__(self, backend, write):
+        self.backend = backend
+        self.write = write
+
+    def lookup(self, key: str):
+        return self.backend.lookup(key)
+
+    async def lookup_async(self, key: str):
+        return await self.backend.lookup_async(key)
+
+    def store(self, key: str, value: str, generation) -> None:
+        self.race()
+        self.backend.store(key, value, generation)
+
+    async def store_async(self, key: str, value: str, generation) -> None:
+        self.race()
+        await self.backend.store_async(key, value, generation)
+
+    def invalidate(self, *keys: str) -> None:
+        self.backend.invalidate(*keys)
+
+    def race(self) -> None:
+        write, self.write = self.write, None
+        if write:
+            write()
+
+
+async def check_backend(backend) -> list[str]:
+    failures = []
+
+    def expect(name: str, actual, expected) -> None:
+        if actual != expected:
+            failures.append(f'{name}: expected {expected!r}, got {actual!r}')
+
+    value, generation = backend.lookup('car:1')
+    expect('cold lookup', value, None)
+    backend.store('car:1', 'v1', generation)
+    expect('read-through hit', backend.lookup('car:1')[0], 'v1')
+    expect('async hit', (await backend.lookup_async('car:1'))[0], 'v1')
+
+    backend.invalidate('car:1')
+    expect('invalidated entry', backend.lookup('car:1')[0], None)
+
+    _, generation = backend.lookup('car:2')
+    backend.invalidate('car:2')
+    backend.store('car:2', 'stale', generation)
+    expect('store after a concurrent invalidate', backend.lookup('car:2')[0], None)
+
+    _, generation = await backend.lookup_async('car:3')
+    backend.invalidate('car:3')
+    await backend.store_async('car:3', 'stale', generation)
+    expect('async store after a concurrent invalidate', (await backend.lookup_async('car:3'))[0], None)
+
+    _, generation = backend.lookup('car:3')
+    backend.store('car:3', 'fresh', generation)
+    expect('store after the invalidate settled', backend.lookup('car:3')[0], 'fresh')
+    return failures
+
+
+def check_generation_eviction() -> list[str]:
+    backend = cache.LRUBackend(maxsize=4, ttl=60)
+    _, generation = backend.lookup('car:1')
+    backend.invalidate('car:1', *(f'garage:{id}' for id in range(10)))
+    backend.store('car:1', 'stale', generation)
+    if backend.lookup('car:1')[0] is not None:
+        return ['memory: a stale store was accepted after the key generation was evicted']
+    return []
+
+
+async def check_service(name: str, make_backend, prefix: str) -> list[str]:
+    carId = create_car(CreateCar(make='Skoda', model='Octavia', productionYear=2018, licensePlate=f'{prefix}0001AA', garageIds=[])).id
+    failures = []
+    for plate, read in ((f'{prefix}0002AA', get_car_async), (f'{prefix}0003AA', get_car)):
+        write = lambda plate=plate: update_car(carId, UpdateCar(make='Skoda', model='Octavia', productionYear=2018, licensePlate=plate, garageIds=[]))
+        cache.cache.backend = RacingBackend(make_backend(), write)
+        stale = read(carId)
+        stale = await stale if asyncio.iscoroutine(stale) else stale
+        served = (await get_car_async(carId)).licensePlate
+        if served != plate:
+            failures.append(f'{name}: {read.__name__} cached {stale.licensePlate} after a concurrent update to {plate}, then served {served}')
+    return failures
+
+
+async def run() -> list[str]:
+    failures = check_generation_eviction()
+    for prefix, (name, make_backend) in zip(('CA', 'CB'), BACKENDS.items()):
+        failures += [f'{name}: {failure}' for failure in await check_backend(make_backend())]
+        failures += await check_service(name, make_backend, prefix)
+    return failures
+
+
+def main() -> int:
+    sqlite_engine()
+    original = cache.cache.backend
+    try:
+        failures = asyncio.run(run())
+    finally:
+        cache.cache.backend = original
+    for failure in failures:
+        print(f'FAILED: {failure}')
+    print(f"{', '.join(BACKENDS)}: {'ok' if not failures else f'{len(failures)} failure(s)'}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Fail if create/update car statement counts grow with the number of garages or a failed write is left half-applied.
+
+Run from the repository root: python -m bench.car_writes
+"""
+import sys
+from fastapi import HTTPException
+from sqlalchemy import func, insert, select
+import database
+from bench.common import sqlite_engine, StatementCounter
+from car_service import create_car, update_car
+from dtos import CreateCar, UpdateCar
+from garage_service import reconcile_occupancy
+from model import Car, Garage, car_garage
+
+GARAGES = 40
+
+
+def seed(engine) -> None:
+    with engine.begin() as connection:
+        connection.execute(insert(Garage), [
+            {'name': f'Garage {i}', 'location': 'Center', 'city': 'Sofia', 'capacity': 100, 'occupancy': 0}
+            for i in range(GARAGES)
+        ])
+        connection.execute(insert(Garage), [{'name': 'Full Garage', 'location': 'Center', 'city': 'Sofia', 'capacity': 1, 'occupancy': 1}])
+        connection.execute(insert(Car), [{'make': 'Ford', 'model': 'Focus', 'productionYear': 2015, 'licensePlate': 'CB0000'}])
+        connection.execute(insert(car_garage), [{'carId': 1, 'garageId': GARAGES + 1}])
+
+
+def car(plate: str, garageIds: list[int]) -> dict:
+    return {'make': 'Ford', 'model': 'Focus', 'productionYear': 2015, 'licensePlate': plate, 'garageIds': garageIds}
+
+
+def statements(engine, call) -> int:
+    with StatementCounter(engine) as counter:
+        call()
+    return counter.count
+
+
+def car_count() -> int:
+    with database.Session() as session:
+        return session.scalar(select(func.count()).select_from(Car))
+
+
+def main() -> int:
+    engine = sqlite_engine()
+    seed(engine)
+    failed = False
+
+    counts = {}
+    for garages in (1, 20):
+        garageIds = list(range(1, garages + 1))
+        plate = f'CA{garages:04d}'
+        created = []
+        counts[f'create_car ({garages} garages)'] = statements(engine, lambda: created.append(create_car(CreateCar(**car(plate, garageIds)))))
+        moved = list(range(garages // 2 + 2, garages + garages // 2 + 2))
+        counts[f'update_car ({garages} garages)'] = statements(engine, lambda: update_car(created[0].id, UpdateCar(**car(plate, moved))))
+
+    for name, count in counts.items():
+        print(f'{name:32} {count:4}')
+    for operation in ('create_car', 'update_car'):
+        if counts[f'{operation} (1 garages)'] != counts[f'{operation} (20 garages)']:
+            print(f'FAILED: {operation} statements grow with the number of garages')
+            failed = True
+
+    before = car_count()
+    for request in (car('CA9999', [1, GARAGES + 1]), car('CA9998', [1, 999])):
+        try:
+            create_car(CreateCar(**request))
+            print(f'FAILED: create_car accepted {request["garageIds"]}')
+            failed = True
+        except HTTPException:
+            pass
+    try:
+        update_car(2, UpdateCar(**car('CA0001', [2, GARAGES + 1])))
+        print('FAILED: update_car linked a full garage')
+        failed = True
+    except HTTPException:
+        pass
+
+    if car_count() != before:
+        print('FAILED: rejected create_car left a car behind')
+        failed = True
+
+    drifted = reconcile_occupancy()
+    if drifted:
+        print(f'FAILED: {drifted} garages had drifted occupancy')
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,329 @@
+"""Fork several preloaded workers sharing one database and fail if any worker serves stale data after a write on another.
+
+With --serve the same writes go over HTTP to `python serve.py --workers N` while concurrent readers hit every
+endpoint the write invalidates; once the write and the readers finish, no response may be stale. The run ends
+with a row inserted behind the API and `manage.py rebuild-daily-load`, after which no worker may answer 304
+for the old availability report.
+
+Run from the repository root:
+    python -m bench.coherence --workers 4 --rounds 40
+    python -m bench.coherence --without-channel   # shows the stale reads the invalidation channel prevents
+    python -m bench.coherence --serve --workers 4 --rounds 20
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+import httpx
+from sqlalchemy import insert
+import availability
+import cache
+import invalidation
+from bench.common import sqlite_engine, load_app
+from bench.generator import generate
+from database import dispose_after_fork
+from model import Maintenance
+
+
+def worker(app, connection, today: date) -> None:
+    dispose_after_fork()
+    asyncio.run(serve_commands(app, connection, today))
+
+
+async def serve_commands(app, connection, today: date) -> None:
+    async with app.router.lifespan_context(app):
+        availability.load_availability_index(today)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://worker') as client:
+            connection.send('ready')
+            while True:
+                command = await asyncio.to_thread(connection.recv)
+                if command is None:
+                    break
+                method, url, kwargs = command
+                response = await client.request(method, url, **kwargs)
+                connection.send((response.status_code, response.json() if response.content else None, response.headers.get('etag')))
+
+
+class Workers:
+    def __init__(self, connections):
+        self.connections = connections
+
+    def request(self, worker: int, method: str, url: str, **kwargs):
+        self.connections[worker].send((method, url, kwargs))
+        return self.connections[worker].recv()
+
+
+def check_round(workers: Workers, rng: random.Random, dataset, writer: int, today: date) -> list[str]:
+    readers = [index for index in range(len(workers.connections)) if index != writer]
+    stale = []
+
+    def read_all(url: str, **kwargs) -> dict:
+        return {reader: workers.request(reader, 'GET', url, **kwargs) for reader in readers}
+
+    def expect(name: str, responses: dict, check) -> None:
+        for reader, (status, body, _) in responses.items():
+            if status == 304 or not check(body):
+                stale.append(f'worker {reader} served stale {name} after a write on worker {writer}')
+
+    carId = rng.choice(list(dataset.links))
+    garageId = rng.choice(dataset.links[carId])
+    day = today + timedelta(days=rng.randint(1, 300))
+    suffix = rng.randrange(10 ** 6)
+
+    read_all(f'/cars/{carId}')
+    plate = f'CO{suffix:06d}'
+    car = workers.request(writer, 'GET', f'/cars/{carId}')[1]
+    workers.request(writer, 'PUT', f'/cars/{carId}', json={**{key: car[key] for key in ('make', 'model', 'productionYear')}, 'licensePlate': plate, 'garageIds': dataset.links[carId]})
+    expect('car', read_all(f'/cars/{carId}'), lambda body: body['licensePlate'] == plate)
+
+    garage = workers.request(writer, 'GET', f'/garages/{garageId}')[1]
+    before = read_all('/garages/', params={'city': garage['city']})
+    read_all(f'/garages/{garageId}')
+    name = f"Garage {''.join(rng.choice('abcdefghij') for _ in range(8))}"
+    workers.request(writer, 'PUT', f'/garages/{garageId}', json={**{key: garage[key] for key in ('location', 'city', 'capacity')}, 'name': name})
+    expect('garage', read_all(f'/garages/{garageId}'), lambda body: body['name'] == name)
+    for reader, (_, _, etag) in before.items():
+        status, body, _ = workers.request(reader, 'GET', '/garages/', params={'city': garage['city']}, headers={'If-None-Match': etag})
+        expect('garage list', {reader: (status, body, None)}, lambda body: any(item['name'] == name for item in body))
+
+    params = {'garageId': garageId, 'startDate': str(day), 'endDate': str(day)}
+    before = read_all('/garages/dailyAvailabilityReport', params=params)
+    requests = next(iter(before.values()))[1][0]['requests']
+    created = workers.request(writer, 'POST', '/maintenance/', json={'carId': carId, 'garageId': garageId, 'serviceType': 'Inspection', 'scheduledDate': str(day)})[1]
+    for reader, (_, _, etag) in before.items():
+        response = workers.request(reader, 'GET', '/garages/dailyAvailabilityReport', params=params, headers={'If-None-Match': etag})
+        expect('availability', {reader: response}, lambda body: body[0]['requests'] == requests + 1)
+
+    read_all(f"/maintenance/{created['id']}")
+    workers.request(writer, 'PUT', f"/maintenance/{created['id']}", json={'carId': carId, 'garageId': garageId, 'serviceType': 'Brake service', 'scheduledDate': str(day)})
+    expect('maintenance', read_all(f"/maintenance/{created['id']}"), lambda body: body['serviceType'] == 'Brake service')
+
+    workers.request(writer, 'DELETE', f"/maintenance/{created['id']}")
+    expect('deleted maintenance', read_all(f"/maintenance/{created['id']}"), lambda body: body.get('detail') == 'Maintenance not found')
+    expect('availability', read_all('/garages/dailyAvailabilityReport', params=params), lambda body: body[0]['requests'] == requests)
+    return stale
+
+
+READERS = 8
+BURST = 32
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve_env(path: str, directory: str) -> dict:
+    return {
+        **os.environ,
+        'DB_ECHO': 'false',
+        'DATABASE_URL': f'sqlite:///{path}',
+        'ASYNC_DATABASE_URL': f'sqlite+aiosqlite:///{path}',
+        'AVAILABILITY_INDEX': 'true',
+        'INVALIDATION_DIR': directory,
+        'PYTHONPATH': os.getcwd()
+    }
+
+
+def launch_serve(env: dict, workers: int, port: int) -> subprocess.Popen:
+    command = [sys.executable, '-W', 'ignore', 'serve.py', '--workers', str(workers), '--port', str(port), '--log-level', 'warning']
+    process = subprocess.Popen(command, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'serve.py exited with {process.returncode}')
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/metrics').status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit('serve.py did not start within 60 s')
+
+
+async def read_until(client: httpx.AsyncClient, done: asyncio.Event, reads: list) -> None:
+    while not done.is_set():
+        for url, kwargs in reads:
+            await client.get(url, **kwargs)
+
+
+async def write_while_reading(client: httpx.AsyncClient, reads: list, method: str, url: str, **kwargs) -> httpx.Response:
+    done = asyncio.Event()
+    readers = [asyncio.create_task(read_until(client, done, reads)) for _ in range(READERS)]
+    await asyncio.sleep(0.01)
+    try:
+        response = await client.request(method, url, **kwargs)
+    finally:
+        done.set()
+        await asyncio.gather(*readers)
+    return response
+
+
+async def read_burst(client: httpx.AsyncClient, url: str, **kwargs) -> list[httpx.Response]:
+    return await asyncio.gather(*(client.get(url, **kwargs) for _ in range(BURST)))
+
+
+async def check_served_round(client: httpx.AsyncClient, rng: random.Random, dataset, today: date) -> list[str]:
+    stale = []
+
+    def expect(name: str, responses: list[httpx.Response], check) -> None:
+        failed = sum(response.status_code == 304 or not check(response.json()) for response in responses)
+        if failed:
+            stale.append(f'{failed} of {len(responses)} reads served stale {name} after the write completed')
+
+    carId = rng.choice(list(dataset.links))
+    garageId = rng.choice(dataset.links[carId])
+    day = today + timedelta(days=rng.randint(1, 300))
+    suffix = rng.randrange(10 ** 6)
+
+    car = (await client.get(f'/cars/{carId}')).json()
+    await read_burst(client, f'/cars/{carId}')
+    plate = f'CS{suffix:06d}'
+    await write_while_reading(client, [(f'/cars/{carId}', {})], 'PUT', f'/cars/{carId}', json={**{key: car[key] for key in ('make', 'model', 'productionYear')}, 'licensePlate': plate, 'garageIds': dataset.links[carId]})
+    expect('car', await read_burst(client, f'/cars/{carId}'), lambda body: body['licensePlate'] == plate)
+
+    garage = (await client.get(f'/garages/{garageId}')).json()
+    listing = ('/garages/', {'params': {'city': garage['city']}})
+    etags = {response.headers.get('etag') for response in await read_burst(client, listing[0], **listing[1])} - {None}
+    name = f"Garage {''.join(rng.choice('abcdefghij') for _ in range(8))}"
+    await write_while_reading(client, [(f'/garages/{garageId}', {}), listing], 'PUT', f'/garages/{garageId}', json={**{key: garage[key] for key in ('location', 'city', 'capacity')}, 'name': name})
+    expect('garage', await read_burst(client, f'/garages/{garageId}'), lambda body: body['name'] == name)
+    for etag in etags:
+        responses = await read_burst(client, listing[0], headers={'If-None-Match': etag}, **listing[1])
+        expect('garage list', responses, lambda body: any(item['name'] == name for item in body))
+
+    report = ('/garages/dailyAvailabilityReport', {'params': {'garageId': garageId, 'startDate': str(day), 'endDate': str(day)}})
+    before = await read_burst(client, report[0], **report[1])
+    requests = before[0].json()[0]['requests']
+    etags = {response.headers.get('etag') for response in before} - {None}
+    created = (await write_while_reading(client, [report], 'POST', '/maintenance/', json={'carId': carId, 'garageId': garageId, 'serviceType': 'Inspection', 'scheduledDate': str(day)})).json()
+    for etag in etags or {None}:
+        headers = {'If-None-Match': etag} if etag else {}
+        expect('availability', await read_burst(client, report[0], headers=headers, **report[1]), lambda body: body[0]['requests'] == requests + 1)
+
+    maintenance = f"/maintenance/{created['id']}"
+    await read_burst(client, maintenance)
+    await write_while_reading(client, [(maintenance, {})], 'PUT', maintenance, json={'carId': carId, 'garageId': garageId, 'serviceType': 'Brake service', 'scheduledDate': str(day)})
+    expect('maintenance', await read_burst(client, maintenance), lambda body: body['serviceType'] == 'Brake service')
+
+    await write_while_reading(client, [(maintenance, {}), report], 'DELETE', maintenance)
+    expect('deleted maintenance', await read_burst(client, maintenance), lambda body: body.get('detail') == 'Maintenance not found')
+    expect('availability', await read_burst(client, report[0], **report[1]), lambda body: body[0]['requests'] == requests)
+    return stale
+
+
+async def check_manage_write(client: httpx.AsyncClient, engine, env: dict, rng: random.Random, dataset, today: date) -> list[str]:
+    carId = rng.choice(list(dataset.links))
+    garageId = rng.choice(dataset.links[carId])
+    day = today + timedelta(days=rng.randint(1, 300))
+    report = ('/garages/dailyAvailabilityReport', {'params': {'garageId': garageId, 'startDate': str(day), 'endDate': str(day)}})
+    before = await read_burst(client, report[0], **report[1])
+    requests = before[0].json()[0]['requests']
+    etags = {response.headers.get('etag') for response in before} - {None}
+
+    with engine.begin() as connection:
+        connection.execute(insert(Maintenance).values(carId=carId, garageId=garageId, serviceType='Inspection', scheduledDate=day))
+    rebuilt = await asyncio.to_thread(subprocess.run, [sys.executable, '-W', 'ignore', 'manage.py', 'rebuild-daily-load'], env=env, capture_output=True, text=True)
+    if rebuilt.returncode != 0:
+        return [f'manage.py rebuild-daily-load failed: {rebuilt.stderr.strip()}']
+
+    stale = []
+    for etag in etags or {None}:
+        headers = {'If-None-Match': etag} if etag else {}
+        responses = await read_burst(client, report[0], headers=headers, **report[1])
+        failed = sum(response.status_code == 304 or response.json()[0]['requests'] != requests + 1 for response in responses)
+        if failed:
+            stale.append(f'{failed} of {len(responses)} reads served a stale availability report after manage.py rebuild-daily-load')
+    return stale
+
+
+async def run_served(port: int, rounds: int, rng: random.Random, dataset, today: date, engine, env: dict) -> list[str]:
+    limits = httpx.Limits(max_connections=READERS + BURST, max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', limits=limits, timeout=30) as client:
+        stale = []
+        for _ in range(rounds):
+            stale.extend(await check_served_round(client, rng, dataset, today))
+        stale.extend(await check_manage_write(client, engine, env, rng, dataset, today))
+        return stale
+
+
+def serve_main(args, engine, dataset, today: date) -> list[str]:
+    engine.dispose()
+    directory = tempfile.mkdtemp(prefix='car-management-')
+    env = serve_env(engine.url.database, directory)
+    process = launch_serve(env, args.workers, port := free_port())
+    try:
+        return asyncio.run(run_served(port, args.rounds, random.Random(args.seed), dataset, today, engine, env))
+    finally:
+        process.terminate()
+        process.wait(10)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Cross-worker cache coherence check')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--without-channel', action='store_true', help='Disable the invalidation channel and shared versions')
+    parser.add_argument('--serve', action='store_true', help='Run the checks over HTTP against serve.py --workers N')
+    args = parser.parse_args()
+
+    today = date.today()
+    engine = sqlite_engine()
+    dataset = generate(engine, 50, 1000, 5000, args.seed, endDate=date(today.year + 1, 12, 31))
+
+    if args.serve:
+        stale = serve_main(args, engine, dataset, today)
+        for message in stale[:20]:
+            print(f'STALE: {message}')
+        print(f'serve.py --workers {args.workers}, {args.rounds} rounds, {len(stale)} stale reads')
+        return 1 if stale else 0
+
+    directory = tempfile.mkdtemp(prefix='car-management-')
+    if not args.without_channel:
+        invalidation.INVALIDATION_DIR = directory
+        cache.share_versions()
+    app = load_app()
+
+    context = multiprocessing.get_context('fork')
+    connections, processes = [], []
+    for _ in range(args.workers):
+        parent, child = context.Pipe()
+        process = context.Process(target=worker, args=(app, child, today), daemon=True)
+        process.start()
+        connections.append(parent)
+        processes.append(process)
+    for connection in connections:
+        connection.recv()
+
+    stale = []
+    try:
+        workers = Workers(connections)
+        rng = random.Random(args.seed)
+        for number in range(args.rounds):
+            stale.extend(check_round(workers, rng, dataset, number % args.workers, today))
+    finally:
+        for connection in connections:
+            connection.send(None)
+        for process in processes:
+            process.join(5)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    for message in stale[:20]:
+        print(f'STALE: {message}')
+    print(f'{args.workers} workers, {args.rounds} rounds, {len(stale)} stale reads')
+    return 1 if stale else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
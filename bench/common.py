@@ -0,0 +1,75 @@
+import os
+import statistics
+import tempfile
+import time
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+import database
+from model import Base
+
+
+def sqlite_engine(path: str = None):
+    path = path or os.path.join(tempfile.mkdtemp(prefix='car-management-bench-'), 'bench.db')
+    engine = create_engine(f'sqlite:///{path}')
+    Base.metadata.create_all(engine)
+    database.Session.configure(bind=engine)
+    database.AsyncSession.configure(bind=create_async_engine(f'sqlite+aiosqlite:///{path}'))
+    return engine
+
+
+def bench_engine(url: str = None, reset: bool = False):
+    if url is None or url.startswith('sqlite'):
+        return sqlite_engine(url.split('///', 1)[1] if url else None)
+
+    engine = create_engine(url)
+    if reset:
+        Base.metadata.drop_all(engine)
+    elif inspect(engine).get_table_names():
+        raise SystemExit(f'{engine.url} already has tables, pass --reset to drop and recreate them')
+    Base.metadata.create_all(engine)
+    database.Session.configure(bind=engine)
+    database.AsyncSession.configure(bind=create_async_engine(url.replace('+pymysql', '+aiomysql')))
+    return engine
+
+
+def load_app():
+    from main import app
+    return app
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+def measure(engine, fn, repeat: int = 5) -> dict:
+    timings = []
+    with StatementCounter(engine) as counter:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+
+    return {
+        'statements': counter.count // repeat,
+        'median_ms': round(statistics.median(timings), 2),
+        'min_ms': round(min(timings), 2)
+    }
+
+
+def print_table(headers: list[str], rows: list[list]) -> None:
+    widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+    for row in [headers, *rows]:
+        print('  '.join(str(value).rjust(width) for value, width in zip(row, widths)))
@@ -0,0 +1,82 @@
+"""Compare the per-day COUNT loop with the grouped daily availability report.
+
+Run from the repository root: python -m bench.daily_availability
+"""
+import random
+from datetime import date, timedelta
+from sqlalchemy import insert
+from bench.common import sqlite_engine, measure, print_table
+from database import Session
+from dtos import dailyAvailabilityReport
+from garage_service import get_daily_availability_report, get_daily_availability_reports, get_garage_by_id, rebuild_daily_load
+from model import Garage, Maintenance
+
+START = date(2020, 1, 1)
+GARAGES = 5
+YEARS = 10
+
+
+def legacy_daily_availability_report(garageId: int, startDate: date, endDate: date) -> list[dailyAvailabilityReport]:
+    with Session() as session:
+        garage = get_garage_by_id(garageId, session)
+        report = []
+        current_date = startDate
+        while current_date <= endDate:
+            maintenances = session.query(Maintenance).filter(
+                Maintenance.garageId == garageId,
+                Maintenance.scheduledDate == current_date
+            ).count()
+            report.append(dailyAvailabilityReport(
+                date=current_date,
+                requests=maintenances,
+                availableCapacity=garage.capacity - maintenances
+            ))
+            current_date += timedelta(days=1)
+        return report
+
+
+def seed(engine) -> None:
+    rng = random.Random(42)
+    with engine.begin() as connection:
+        connection.execute(insert(Garage), [
+            {'name': f'Garage {chr(65 + i)}', 'location': 'Center', 'city': 'Sofia', 'capacity': 20}
+            for i in range(GARAGES)
+        ])
+        connection.execute(insert(Maintenance), [
+            {
+                'serviceType': 'Oil change',
+                'scheduledDate': START + timedelta(days=rng.randrange(365 * YEARS)),
+                'garageId': rng.randint(1, GARAGES)
+            }
+            for _ in range(GARAGES * 365 * YEARS * 3)
+        ])
+    rebuild_daily_load()
+
+
+def main() -> None:
+    engine = sqlite_engine()
+    seed(engine)
+    garageIds = list(range(1, GARAGES + 1))
+
+    rows = []
+    for days in (30, 365, 3650):
+        end = START + timedelta(days=days - 1)
+        assert legacy_daily_availability_report(1, START, end) == get_daily_availability_report(1, START, end)
+        legacy = measure(engine, lambda: legacy_daily_availability_report(1, START, end), repeat=1)
+        grouped = measure(engine, lambda: get_daily_availability_report(1, START, end), repeat=3)
+        multi = measure(engine, lambda: get_daily_availability_reports(garageIds, START, end), repeat=3)
+        rows.append([
+            days,
+            legacy['statements'], legacy['median_ms'],
+            grouped['statements'], grouped['median_ms'],
+            multi['statements'], multi['median_ms']
+        ])
+
+    print_table(
+        ['days', 'loop stmts', 'loop ms', 'grouped stmts', 'grouped ms', f'{GARAGES} garages stmts', f'{GARAGES} garages ms'],
+        rows
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Check with EXPLAIN QUERY PLAN that the list and report queries use the filter indexes.
+
+Run from the repository root: python -m bench.explain
+"""
+import sys
+from datetime import date
+from datetime import timedelta
+from sqlalchemy import func, insert, select
+from bench.common import sqlite_engine
+from car_service import select_cars
+from garage_service import select_garages, select_daily_loads, select_fully_booked_days, rebuild_daily_load
+from maintenance_service import select_maintenances, select_monthly_counts
+from model import Car, Garage, Maintenance, car_garage
+
+EXPECTED_INDEXES = {
+    'cars by make and year': (select_cars(carMake='Make 1', fromYear=2010), 'ix_car_make_productionYear'),
+    'cars by year range': (select_cars(fromYear=2010, toYear=2020), 'ix_car_productionYear'),
+    'cars by garage': (select_cars(garageId=1), 'ix_car_garage_garageId_carId'),
+    'garages by city': (select_garages(city='City 1'), 'ix_garage_city'),
+    'maintenances by garage and date': (select_maintenances(garageId=1, startDate=date(2024, 1, 1)), 'ix_maintenance_garageId_scheduledDate'),
+    'maintenances by car': (select_maintenances(carId=1), 'ix_maintenance_carId_scheduledDate'),
+    'daily availability report': (select_daily_loads([1, 2], date(2024, 1, 1), date(2024, 12, 31)), 'sqlite_autoindex_garage_daily_load_1'),
+    'fully booked days in city': (select_fully_booked_days('City 1', 10, date(2024, 1, 1), date(2024, 1, 31)), 'sqlite_autoindex_garage_daily_load_1'),
+    'monthly requests report': (select_monthly_counts([1, 2], date(2024, 1, 1), date(2024, 12, 1)), 'sqlite_autoindex_garage_daily_load_1'),
+    'garage capacity': (select(func.count()).select_from(car_garage).where(car_garage.c.garageId == 1), 'ix_car_garage_garageId_carId'),
+}
+
+
+def seed(engine, rows: int = 2000) -> None:
+    with engine.begin() as connection:
+        connection.execute(insert(Garage), [
+            {'name': f'Garage {i}', 'location': 'Center', 'city': f'City {i % 20}', 'capacity': 10}
+            for i in range(rows // 10)
+        ])
+        connection.execute(insert(Car), [
+            {'make': f'Make {i % 20}', 'model': 'Model', 'productionYear': 1990 + i % 35, 'licensePlate': f'CA{i:06d}'}
+            for i in range(rows)
+        ])
+        connection.execute(insert(car_garage), [
+            {'carId': i + 1, 'garageId': i % (rows // 10) + 1} for i in range(rows)
+        ])
+        connection.execute(insert(Maintenance), [
+            {'serviceType': 'Oil change', 'scheduledDate': date(2020, 1, 1) + timedelta(days=i % 1500),
+             'carId': i % rows + 1, 'garageId': i % (rows // 10) + 1}
+            for i in range(rows * 5)
+        ])
+    rebuild_daily_load()
+
+
+def main() -> int:
+    engine = sqlite_engine()
+    seed(engine)
+    with engine.connect() as connection:
+        connection.exec_driver_sql('ANALYZE')
+        failed = False
+        for name, (statement, index) in EXPECTED_INDEXES.items():
+            sql = str(statement.compile(engine, compile_kwargs={'literal_binds': True}))
+            plan = ' | '.join(row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}'))
+            status = 'ok' if index in plan else 'MISSING'
+            failed = failed or status != 'ok'
+            print(f'{name:34} {status:8} {plan}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
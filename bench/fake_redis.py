@@ -0,0 +1,87 @@
+"""In-process stand-in for the subset of the redis-py API that cache.RedisBackend uses."""
+import threading
+import time
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.expires = {}
+        self.lock = threading.RLock()
+
+    def _get(self, key: str):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return self.values.get(key)
+
+    def get(self, key: str):
+        with self.lock:
+            return self._get(key)
+
+    def mget(self, *keys: str) -> list:
+        with self.lock:
+            return [self._get(key) for key in keys]
+
+    def set(self, key: str, value, ex: int = None) -> bool:
+        with self.lock:
+            self.values[key] = value.encode() if isinstance(value, str) else value
+            if ex is None:
+                self.expires.pop(key, None)
+            else:
+                self.expires[key] = time.monotonic() + ex
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self.lock:
+            deleted = sum(self._get(key) is not None for key in keys)
+            for key in keys:
+                self.values.pop(key, None)
+                self.expires.pop(key, None)
+            return deleted
+
+    def incr(self, key: str) -> int:
+        with self.lock:
+            value = int(self._get(key) or 0) + 1
+            self.values[key] = str(value).encode()
+            return value
+
+    def expire(self, key: str, seconds: int) -> bool:
+        with self.lock:
+            if self._get(key) is None:
+                return False
+            self.expires[key] = time.monotonic() + seconds
+            return True
+
+    def pipeline(self) -> 'FakePipeline':
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.queued = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self.queued.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> list:
+        with self.client.lock:
+            results = [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.queued]
+        self.queued = []
+        return results
+
+
+class FakeAsyncRedis:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+
+    async def mget(self, *keys: str) -> list:
+        return self.client.mget(*keys)
+
+    async def set(self, key: str, value, ex: int = None) -> bool:
+        return self.client.set(key, value, ex=ex)
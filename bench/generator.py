@@ -0,0 +1,168 @@
+"""Seeded synthetic data: garages, cars with car_garage links and skewed maintenances.
+
+Run from the repository root: python -m bench.generator --garages 200 --cars 20000 --maintenances 100000
+"""
+import argparse
+import random
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from sqlalchemy import bindparam, insert, update
+from bench.common import bench_engine
+from garage_service import rebuild_daily_load
+from model import Car, Garage, Maintenance, car_garage
+
+CITIES = ['Sofia', 'Plovdiv', 'Varna', 'Burgas', 'Ruse', 'Stara Zagora', 'Pleven', 'Sliven', 'Dobrich', 'Shumen', 'Pernik', 'Haskovo']
+STREETS = ['Vitosha', 'Rakovski', 'Shipka', 'Tsar Simeon', 'Graf Ignatiev', 'Levski', 'Botev', 'Slivnitsa']
+NAMES = ['Auto', 'Motor', 'Service', 'Garage', 'Drive', 'Wheel', 'Pit', 'Torque']
+MAKES = ['Toyota', 'Volkswagen', 'Ford', 'Renault', 'Opel', 'Skoda', 'BMW', 'Audi', 'Peugeot', 'Hyundai', 'Kia', 'Dacia']
+MODELS = ['Sedan', 'Hatch', 'Wagon', 'Coupe', 'Van', 'Crossover']
+SERVICES = ['Oil change', 'Tyre change', 'Inspection', 'Brake service', 'Battery replacement', 'Air conditioning', 'Timing belt']
+WEEKDAY_WEIGHTS = [1.0, 1.0, 0.95, 0.9, 1.1, 0.45, 0.1]
+TYRE_MONTHS = {3, 4, 10, 11}
+CHUNK = 20000
+
+
+@dataclass
+class Dataset:
+    garageIds: list
+    carIds: list
+    maintenanceIds: list
+    cities: list
+    links: dict
+    startDate: date
+    endDate: date
+
+
+def zipf_weights(n: int, s: float) -> list[float]:
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def garage_rows(rng: random.Random, garages: int, cars: int) -> list[dict]:
+    cityWeights = zipf_weights(len(CITIES), 1.1)
+    average = max(cars * 2 // max(garages, 1), 10)
+    return [
+        {
+            'name': f'{rng.choice(NAMES)} {rng.choice(NAMES)}',
+            'location': f'{rng.choice(STREETS)} Street',
+            'city': rng.choices(CITIES, cityWeights)[0],
+            'capacity': rng.randint(average, average * 3),
+            'occupancy': 0
+        }
+        for _ in range(garages)
+    ]
+
+
+def car_rows(rng: random.Random, cars: int) -> list[dict]:
+    makeWeights = zipf_weights(len(MAKES), 0.9)
+    return [
+        {
+            'make': rng.choices(MAKES, makeWeights)[0],
+            'model': rng.choice(MODELS),
+            'productionYear': min(2025, int(rng.triangular(1995, 2026, 2018))),
+            'licensePlate': f'CB{index:07d}'
+        }
+        for index in range(cars)
+    ]
+
+
+def link_rows(rng: random.Random, carIds: list[int], garages: list[dict], garageIds: list[int]) -> list[dict]:
+    popularity = zipf_weights(len(garageIds), 0.8)
+    rng.shuffle(popularity)
+    free = {garageId: garage['capacity'] for garageId, garage in zip(garageIds, garages)}
+    links = []
+    for carId in carIds:
+        for garageId in set(rng.choices(garageIds, popularity, k=rng.choice([1, 1, 1, 2, 2, 3]))):
+            if free[garageId] > 0:
+                free[garageId] -= 1
+                links.append({'carId': carId, 'garageId': garageId})
+    return links
+
+
+def scheduled_dates(rng: random.Random, count: int, startDate: date, endDate: date) -> list[date]:
+    days = (endDate - startDate).days + 1
+    calendar = [startDate + timedelta(days=offset) for offset in range(days)]
+    weights = [
+        WEEKDAY_WEIGHTS[day.weekday()] * (1.8 if day.month in TYRE_MONTHS else 1.0) * (0.5 + offset / days)
+        for offset, day in enumerate(calendar)
+    ]
+    return rng.choices(calendar, weights, k=count)
+
+
+def maintenance_rows(rng: random.Random, count: int, links: list[dict], startDate: date, endDate: date) -> list[dict]:
+    rows = []
+    for day, link in zip(scheduled_dates(rng, count, startDate, endDate), rng.choices(links, k=count)):
+        lead = timedelta(hours=int(rng.expovariate(1 / (24 * 12))))
+        rows.append({
+            'serviceType': rng.choice(SERVICES),
+            'scheduledDate': day,
+            'createdAt': datetime.combine(day, datetime.min.time()) + timedelta(hours=9) - lead,
+            'carId': link['carId'],
+            'garageId': link['garageId']
+        })
+    return rows
+
+
+def insert_chunks(connection, table, rows: list[dict]) -> None:
+    for start in range(0, len(rows), CHUNK):
+        connection.execute(insert(table), rows[start:start + CHUNK])
+
+
+def generate(engine, garages: int = 200, cars: int = 20000, maintenances: int = 100000, seed: int = 42, endDate: date = date(2025, 12, 31), years: int = 3) -> Dataset:
+    rng = random.Random(seed)
+    startDate = date(endDate.year - years + 1, 1, 1)
+
+    garageValues = garage_rows(rng, garages, cars)
+    with engine.begin() as connection:
+        insert_chunks(connection, Garage.__table__, garageValues)
+        garageIds = list(range(1, garages + 1))
+
+        insert_chunks(connection, Car.__table__, car_rows(rng, cars))
+        carIds = list(range(1, cars + 1))
+
+        links = link_rows(rng, carIds, garageValues, garageIds)
+        insert_chunks(connection, car_garage, links)
+        occupancy = Counter(link['garageId'] for link in links)
+        if occupancy:
+            connection.execute(
+                update(Garage.__table__).where(Garage.__table__.c.id == bindparam('garage_id')).values(occupancy=bindparam('count')),
+                [{'garage_id': garageId, 'count': count} for garageId, count in occupancy.items()]
+            )
+
+        insert_chunks(connection, Maintenance.__table__, maintenance_rows(rng, maintenances, links, startDate, endDate) if links else [])
+
+    rebuild_daily_load()
+
+    linked = {}
+    for link in links:
+        linked.setdefault(link['carId'], []).append(link['garageId'])
+
+    return Dataset(
+        garageIds=garageIds,
+        carIds=carIds,
+        maintenanceIds=list(range(1, (maintenances if links else 0) + 1)),
+        cities=sorted({garage['city'] for garage in garageValues}),
+        links=linked,
+        startDate=startDate,
+        endDate=endDate
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate a seeded synthetic dataset')
+    parser.add_argument('--database-url', help='SQLAlchemy URL, defaults to a temporary SQLite file')
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate all tables on a non-SQLite database')
+    parser.add_argument('--garages', type=int, default=200)
+    parser.add_argument('--cars', type=int, default=20000)
+    parser.add_argument('--maintenances', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    engine = bench_engine(args.database_url, args.reset)
+    dataset = generate(engine, args.garages, args.cars, args.maintenances, args.seed)
+    print(f'Generated {len(dataset.garageIds)} garages, {len(dataset.carIds)} cars, '
+          f'{sum(map(len, dataset.links.values()))} links, {len(dataset.maintenanceIds)} maintenances in {engine.url}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Compare throughput of sync (threadpool) and async route handlers under concurrency.
+
+Run from the repository root: python -m bench.load
+"""
+import os
+
+os.environ.setdefault('CACHE_BACKEND', 'none')
+
+import asyncio
+import random
+import time
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import insert
+from bench.common import sqlite_engine, load_app, print_table
+from car_service import get_car
+from dtos import ResponseCar
+from model import Car
+
+CARS = 1000
+CONCURRENCY = (50, 200, 1000)
+
+
+def sync_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get('/cars/{id}', response_model=ResponseCar)
+    def get_single_car(id: int):
+        return get_car(id)
+
+    return app
+
+
+async def run_load(app: FastAPI, concurrency: int, total: int) -> float:
+    rng = random.Random(concurrency)
+    remaining = total
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            response = await client.get(f'/cars/{rng.randint(1, CARS)}')
+            response.raise_for_status()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        return total / (time.perf_counter() - started)
+
+
+async def run_levels(apps: dict[str, FastAPI]) -> list[list]:
+    rows = []
+    for concurrency in CONCURRENCY:
+        total = max(2000, concurrency * 4)
+        rows.append([concurrency, total] + [round(await run_load(app, concurrency, total)) for app in apps.values()])
+    return rows
+
+
+def main() -> None:
+    engine = sqlite_engine()
+    with engine.begin() as connection:
+        connection.execute(insert(Car), [
+            {'make': 'Ford', 'model': 'Focus', 'productionYear': 2015, 'licensePlate': f'CA{i:06d}'}
+            for i in range(CARS)
+        ])
+
+    apps = {'sync def': sync_app(), 'async def': load_app()}
+    rows = asyncio.run(run_levels(apps))
+    print_table(['clients', 'requests'] + [f'{name} req/s' for name in apps], rows)
+
+
+if __name__ == '__main__':
+    main()
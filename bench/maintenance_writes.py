@@ -0,0 +1,112 @@
+"""Fail if create/update/delete maintenance issue more SQL statements than their budget, or bulk ids do not match their rows.
+
+Run from the repository root: python -m bench.maintenance_writes
+"""
+import sys
+from datetime import date
+from sqlalchemy import insert, select
+from bench.common import sqlite_engine, StatementCounter
+from dtos import UpdateMaintenance
+from garage_service import rebuild_daily_load, reconcile_occupancy
+from maintenance_service import create_maintenances, delete_maintenance, update_maintenance
+from model import Car, Garage, Maintenance, car_garage
+
+BUDGETS = {
+    'create_maintenances (RETURNING)': 9,
+    'create_maintenances (without RETURNING)': 9,
+    'update_maintenance (same car, garage and date)': 3,
+    'update_maintenance (new date)': 5,
+    'update_maintenance (new car and garage)': 8,
+    'delete_maintenance': 5,
+}
+
+
+def seed(engine) -> None:
+    with engine.begin() as connection:
+        connection.execute(insert(Garage), [
+            {'name': f'Garage {i}', 'location': 'Center', 'city': 'Sofia', 'capacity': 10, 'occupancy': 2}
+            for i in range(2)
+        ])
+        connection.execute(insert(Car), [
+            {'make': 'Ford', 'model': 'Focus', 'productionYear': 2015, 'licensePlate': f'CA{i:06d}'}
+            for i in range(2)
+        ])
+        connection.execute(insert(car_garage), [{'carId': carId, 'garageId': garageId} for carId in (1, 2) for garageId in (1, 2)])
+        connection.execute(insert(Maintenance), [
+            {'serviceType': 'Oil change', 'scheduledDate': date(2024, 1, 1), 'carId': 1, 'garageId': 1}
+            for _ in range(3)
+        ])
+    rebuild_daily_load()
+
+
+def maintenance(carId: int, garageId: int, scheduledDate: date) -> UpdateMaintenance:
+    return UpdateMaintenance(carId=carId, garageId=garageId, serviceType='Inspection', scheduledDate=scheduledDate)
+
+
+BULK = [
+    {'carId': 1, 'garageId': 1, 'serviceType': 'Inspection', 'scheduledDate': '2024-03-01'},
+    {'carId': 2, 'garageId': 2, 'serviceType': 'Oil change', 'scheduledDate': '2024-03-02'},
+    {'carId': 1, 'garageId': 1, 'serviceType': 'Inspection', 'scheduledDate': '2024-03-01'},
+    {'carId': 2, 'garageId': 1, 'serviceType': 'Tyre change', 'scheduledDate': '2024-03-03'},
+]
+
+
+def bulk_create(engine, returning: bool) -> list:
+    dialect = engine.dialect
+    supported = dialect.insert_executemany_returning_sort_by_parameter_order
+    dialect.insert_executemany_returning_sort_by_parameter_order = supported and returning
+    try:
+        return create_maintenances(BULK, batchSize=2)
+    finally:
+        dialect.insert_executemany_returning_sort_by_parameter_order = supported
+
+
+def check_bulk_ids(engine, results: list) -> list[str]:
+    errors = []
+    ids = [result.id for result in results]
+    with engine.connect() as connection:
+        rows = {row.id: row for row in connection.execute(
+            select(Maintenance.id, Maintenance.carId, Maintenance.garageId, Maintenance.serviceType, Maintenance.scheduledDate).where(Maintenance.id.in_(ids))
+        )}
+    if len(set(ids)) != len(BULK):
+        errors.append(f'bulk create returned ids {ids} for {len(BULK)} rows')
+    for id, row in zip(ids, BULK):
+        stored = rows.get(id)
+        if stored is None or (stored.carId, stored.garageId, stored.serviceType, str(stored.scheduledDate)) != tuple(row.values()):
+            errors.append(f'bulk create reported id {id} for {row}')
+    return errors
+
+
+CALLS = {
+    'create_maintenances (RETURNING)': lambda engine: bulk_create(engine, True),
+    'create_maintenances (without RETURNING)': lambda engine: bulk_create(engine, False),
+    'update_maintenance (same car, garage and date)': lambda engine: update_maintenance(1, maintenance(1, 1, date(2024, 1, 1))),
+    'update_maintenance (new date)': lambda engine: update_maintenance(2, maintenance(1, 1, date(2024, 2, 1))),
+    'update_maintenance (new car and garage)': lambda engine: update_maintenance(3, maintenance(2, 2, date(2024, 1, 1))),
+    'delete_maintenance': lambda engine: delete_maintenance(3),
+}
+
+
+def main() -> int:
+    engine = sqlite_engine()
+    seed(engine)
+    failed = False
+    for name, call in CALLS.items():
+        with StatementCounter(engine) as counter:
+            results = call(engine)
+        errors = check_bulk_ids(engine, results) if name.startswith('create_maintenances') else []
+        status = 'OVER BUDGET' if counter.count > BUDGETS[name] else 'WRONG IDS' if errors else 'ok'
+        failed = failed or status != 'ok'
+        print(f'{name:48} {counter.count:3} / {BUDGETS[name]:3}  {status}')
+        for error in errors:
+            print(f'FAILED: {error}')
+
+    drifted = reconcile_occupancy()
+    if drifted:
+        print(f'FAILED: {drifted} garages had drifted occupancy')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Fail if the number of SQL statements issued by a list endpoint grows with row count.
+
+Run from the repository root: python -m bench.query_counts
+"""
+import sys
+from datetime import date, timedelta
+from sqlalchemy import insert
+from bench.common import sqlite_engine, StatementCounter
+from car_service import get_cars
+from garage_service import get_garages
+from maintenance_service import fetch_maintenances
+from model import Car, Garage, Maintenance, car_garage
+
+LIST_CALLS = {
+    'get_cars': lambda: get_cars(),
+    'get_cars(garageId)': lambda: get_cars(garageId=1),
+    'get_garages': lambda: get_garages(),
+    'fetch_maintenances': lambda: fetch_maintenances(),
+    'fetch_maintenances(garageId)': lambda: fetch_maintenances(garageId=1),
+}
+
+
+def seed(engine, rows: int) -> None:
+    with engine.begin() as connection:
+        connection.execute(insert(Garage), [
+            {'name': f'Garage {i}', 'location': 'Center', 'city': 'Sofia', 'capacity': rows}
+            for i in range(rows)
+        ])
+        connection.execute(insert(Car), [
+            {'make': 'Ford', 'model': 'Focus', 'productionYear': 2015, 'licensePlate': f'CA{i:06d}'}
+            for i in range(rows)
+        ])
+        connection.execute(insert(car_garage), [
+            {'carId': i + 1, 'garageId': (i + offset) % rows + 1}
+            for i in range(rows) for offset in (0, 1)
+        ])
+        connection.execute(insert(Maintenance), [
+            {'serviceType': 'Oil change', 'scheduledDate': date(2024, 1, 1) + timedelta(days=i % 365),
+             'carId': i + 1, 'garageId': i % rows + 1}
+            for i in range(rows)
+        ])
+
+
+def count_statements(rows: int) -> dict[str, int]:
+    engine = sqlite_engine()
+    seed(engine, rows)
+    counts = {}
+    for name, call in LIST_CALLS.items():
+        with StatementCounter(engine) as counter:
+            call()
+        counts[name] = counter.count
+    return counts
+
+
+def main() -> int:
+    small, large = count_statements(10), count_statements(500)
+    failed = False
+    for name in LIST_CALLS:
+        status = 'ok' if small[name] == large[name] else 'GROWS'
+        failed = failed or status != 'ok'
+        print(f'{name:32} 10 rows: {small[name]:4}  500 rows: {large[name]:4}  {status}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Per-row serialization cost of validated versus trusted list responses.
+
+Run from the repository root: python -m bench.serialization
+"""
+import json
+import sys
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+import serialization
+from bench.common import sqlite_engine, load_app, print_table
+from car_service import map_car_to_response
+from dtos import ResponseCar, ResponseMaintenance
+from maintenance_service import map_maintenance_to_response
+from model import Car, Garage, Maintenance
+
+ROWS = 10_000
+REPEAT = 5
+
+
+def fixtures() -> dict:
+    garage = SimpleNamespace(id=1, name='Garage A', location='Center', city='Sofia', capacity=50)
+    cars = [
+        SimpleNamespace(id=i, make='Audi', model='A4', productionYear=2000 + i % 25, licensePlate=f'CA{i:06d}', garages=[garage])
+        for i in range(1, ROWS + 1)
+    ]
+    maintenances = [
+        SimpleNamespace(id=i, carId=car.id, car=car, serviceType='Oil change', scheduledDate=date(2024, 1, 1) + timedelta(days=i % 365), garageId=1, garage=garage)
+        for i, car in enumerate(cars, start=1)
+    ]
+    return {
+        'cars': (cars, map_car_to_response, ResponseCar),
+        'maintenances': (maintenances, map_maintenance_to_response, ResponseMaintenance)
+    }
+
+
+def validated(rows, mapper, model) -> bytes:
+    serialization.TRUSTED_OUTPUT = False
+    adapter = TypeAdapter(list[model])
+    content = adapter.validate_python([mapper(row) for row in rows])
+    return json.dumps(adapter.dump_python(content, mode='json'), separators=(',', ':')).encode()
+
+
+def trusted(rows, mapper, model) -> bytes:
+    serialization.TRUSTED_OUTPUT = True
+    factory = serialization.row_factory()
+    return serialization.dumps([mapper(row, factory) for row in rows])
+
+
+def per_row_us(fn, *args) -> float:
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) / ROWS * 1_000_000, 2)
+
+
+def seed(engine) -> None:
+    with engine.begin() as connection:
+        connection.execute(insert(Garage), [{'name': 'Garage A', 'location': 'Center', 'city': 'Sofia', 'capacity': 50}])
+        connection.execute(insert(Car), [
+            {'make': 'Audi', 'model': 'A4', 'productionYear': 2000 + i % 25, 'licensePlate': f'CA{i:06d}'}
+            for i in range(ROWS)
+        ])
+        connection.execute(insert(Maintenance), [
+            {'serviceType': 'Oil change', 'scheduledDate': date(2024, 1, 1) + timedelta(days=i % 365), 'carId': i + 1, 'garageId': 1}
+            for i in range(ROWS)
+        ])
+
+
+def endpoint_per_row_us(client: TestClient, path: str, trusted_output: bool) -> tuple[float, bytes]:
+    serialization.TRUSTED_OUTPUT = trusted_output
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        response = client.get(path)
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) / ROWS * 1_000_000, 2), response.content
+
+
+def main() -> int:
+    failed = False
+    rows = []
+    for name, (items, mapper, model) in fixtures().items():
+        if json.loads(validated(items, mapper, model)) != json.loads(trusted(items, mapper, model)):
+            print(f'FAILED: {name} trusted output differs from validated output')
+            failed = True
+        before = per_row_us(validated, items, mapper, model)
+        after = per_row_us(trusted, items, mapper, model)
+        rows.append([f'{name} (mapping + encoding)', before, after, round(before / after, 1)])
+
+    engine = sqlite_engine()
+    seed(engine)
+    client = TestClient(load_app())
+    for path in (f'/cars/?limit={ROWS}', f'/maintenance/?limit={ROWS}'):
+        before, validated_body = endpoint_per_row_us(client, path, False)
+        after, trusted_body = endpoint_per_row_us(client, path, True)
+        if json.loads(validated_body) != json.loads(trusted_body):
+            print(f'FAILED: GET {path} trusted output differs from validated output')
+            failed = True
+        rows.append([f'GET {path}', before, after, round(before / after, 1)])
+
+    print_table(['10k-row response', 'validated us/row', 'trusted us/row', 'speedup'], rows)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Type, TypeVar
+from pydantic import BaseModel
+from invalidation import publish, subscribe
+from metrics import Counter, Gauge
+
+T = TypeVar('T', bound=BaseModel)
+
+TABLES = ('car', 'garage', 'maintenance', 'car_garage')
+
+table_versions = {table: 0 for table in TABLES}
+_versions_lock = threading.Lock()
+
+
+class SharedVersions:
+    def __init__(self, versions: dict[str, int]):
+        self.array = multiprocessing.Array('q', [versions[table] for table in TABLES])
+
+    def __getitem__(self, table: str) -> int:
+        return self.array[TABLES.index(table)]
+
+    def __setitem__(self, table: str, value: int) -> None:
+        self.array[TABLES.index(table)] = value
+
+cache_requests = Counter('cache_requests_total', 'Entity cache lookups by kind and result')
+
+
+class LocalBackend:
+    async def lookup_async(self, key: str) -> tuple[Optional[str], object]:
+        return self.lookup(key)
+
+    async def store_async(self, key: str, value: str, generation) -> None:
+        self.store(key, value, generation)
+
+
+class LRUBackend(LocalBackend):
+    def __init__(self, maxsize: int = 10000, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.generations = OrderedDict()
+        self.counter = 0
+        self.floor = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, key: str) -> tuple[Optional[str], int]:
+        with self.lock:
+            generation = self.generations.get(key, self.floor)
+            entry = self.entries.get(key)
+            if entry is None:
+                return None, generation
+            value, expires, stored = entry
+            if expires < time.monotonic() or stored != generation:
+                del self.entries[key]
+                return None, generation
+            self.entries.move_to_end(key)
+            return value, generation
+
+    def store(self, key: str, value: str, generation: int) -> None:
+        with self.lock:
+            if generation != self.generations.get(key, self.floor):
+                return
+            self.entries[key] = (value, time.monotonic() + self.ttl, generation)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, *keys: str) -> None:
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+                self.counter += 1
+                self.generations[key] = self.counter
+                self.generations.move_to_end(key)
+            while len(self.generations) > self.maxsize:
+                _, generation = self.generations.popitem(last=False)
+                self.floor = max(self.floor, generation)
+
+
+class RedisBackend:
+    def __init__(self, client, async_client, ttl: float = 60, prefix: str = 'car-management:'):
+        self.client = client
+        self.async_client = async_client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def keys(self, key: str) -> tuple[str, str]:
+        return self.prefix + key, f'{self.prefix}generation:{key}'
+
+    def parse(self, value, generation) -> tuple[Optional[str], str]:
+        generation = decode(generation) or ''
+        if value is None:
+            return None, generation
+        stored, _, value = decode(value).partition('|')
+        return (value if stored == generation else None), generation
+
+    def lookup(self, key: str) -> tuple[Optional[str], str]:
+        return self.parse(*self.client.mget(*self.keys(key)))
+
+    async def lookup_async(self, key: str) -> tuple[Optional[str], str]:
+        return self.parse(*await self.async_client.mget(*self.keys(key)))
+
+    def store(self, key: str, value: str, generation: str) -> None:
+        self.client.set(self.prefix + key, f'{generation}|{value}', ex=int(self.ttl))
+
+    async def store_async(self, key: str, value: str, generation: str) -> None:
+        await self.async_client.set(self.prefix + key, f'{generation}|{value}', ex=int(self.ttl))
+
+    def invalidate(self, *keys: str) -> None:
+        if not keys:
+            return
+        pipeline = self.client.pipeline()
+        for key in keys:
+            entry, generation = self.keys(key)
+            pipeline.delete(entry)
+            pipeline.incr(generation)
+            pipeline.expire(generation, int(self.ttl * 2))
+        pipeline.execute()
+
+
+class NullBackend(LocalBackend):
+    def lookup(self, key: str) -> tuple[Optional[str], None]:
+        return None, None
+
+    def store(self, key: str, value: str, generation) -> None:
+        pass
+
+    def invalidate(self, *keys: str) -> None:
+        pass
+
+
+def decode(value) -> Optional[str]:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class EntityCache:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, kind: str, id: int, model: Type[T]) -> tuple[Optional[T], object]:
+        value, generation = self.backend.lookup(f'{kind}:{id}')
+        return self.parse(kind, model, value), generation
+
+    async def get_async(self, kind: str, id: int, model: Type[T]) -> tuple[Optional[T], object]:
+        value, generation = await self.backend.lookup_async(f'{kind}:{id}')
+        return self.parse(kind, model, value), generation
+
+    def parse(self, kind: str, model: Type[T], value: Optional[str]) -> Optional[T]:
+        cache_requests.inc(kind=kind, result='hit' if value is not None else 'miss')
+        return model.model_validate_json(value) if value is not None else None
+
+    def set(self, kind: str, id: int, response: BaseModel, generation) -> None:
+        self.backend.store(f'{kind}:{id}', response.model_dump_json(), generation)
+
+    async def set_async(self, kind: str, id: int, response: BaseModel, generation) -> None:
+        await self.backend.store_async(f'{kind}:{id}', response.model_dump_json(), generation)
+
+    def invalidate(self, kind: str, *ids: int) -> None:
+        keys = [f'{kind}:{id}' for id in ids]
+        self.backend.invalidate(*keys)
+        if isinstance(self.backend, LRUBackend):
+            publish('cache', keys)
+
+
+def bump_versions(*tables: str) -> None:
+    with _versions_lock:
+        for table in tables:
+            table_versions[table] += 1
+
+
+def get_versions(*tables: str) -> tuple[int, ...]:
+    return tuple(table_versions[table] for table in tables)
+
+
+def versions_shared() -> bool:
+    return isinstance(table_versions, SharedVersions)
+
+
+def share_versions() -> None:
+    global table_versions, _versions_lock
+    if not versions_shared():
+        table_versions = SharedVersions(table_versions)
+        _versions_lock = table_versions.array.get_lock()
+
+
+def build_backend():
+    backend = os.getenv('CACHE_BACKEND', 'memory')
+    ttl = float(os.getenv('CACHE_TTL', 60))
+    if backend == 'memory':
+        return LRUBackend(int(os.getenv('CACHE_MAXSIZE', 10000)), ttl)
+    if backend == 'redis':
+        import redis
+        import redis.asyncio
+        url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+        return RedisBackend(redis.Redis.from_url(url), redis.asyncio.Redis.from_url(url), ttl)
+    if backend == 'none':
+        return NullBackend()
+    raise ValueError(f"Unknown cache backend {backend}")
+
+
+def collect_hit_ratio() -> dict[tuple, float]:
+    totals = {}
+    for labels, value in list(cache_requests.values.items()):
+        labels = dict(labels)
+        hits, lookups = totals.get(labels['kind'], (0, 0))
+        totals[labels['kind']] = (hits + (value if labels['result'] == 'hit' else 0), lookups + value)
+    return {(('kind', kind),): hits / lookups for kind, (hits, lookups) in totals.items() if lookups}
+
+
+Gauge('cache_hit_ratio', 'Entity cache hit ratio by kind', collect=collect_hit_ratio)
+
+cache = EntityCache(build_backend())
+
+subscribe('cache', lambda keys: cache.backend.invalidate(*keys))
+subscribe('versions', lambda tables: bump_versions(*(table for table in tables if table in TABLES)))
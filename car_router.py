@@ -1,17 +1,32 @@
-from fastapi import APIRouter, HTTPException, Query
-from dtos import CreateCar, UpdateCar, ResponseCar
-from car_service import create_car, get_car, get_cars, update_car, delete_car
+import json
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from dtos import CreateCar, UpdateCar, ResponseCar, ResponseBulkResult
+from etag import check_etag, etag_headers
+from serialization import trusted_response
+from car_service import create_car, create_cars, parse_cars_csv, get_car_async, get_cars_async, stream_cars, update_car, delete_car
 
 car_router = APIRouter()
 
 @car_router.get('/', response_model=list[ResponseCar])
-def get_cars_by_make_garage_year(
+async def get_cars_by_make_garage_year(
+        request: Request,
+        response: Response,
         carMake: str = Query(None),
         garageId: int = Query(None),
         fromYear: int = Query(None),
-        toYear: int = Query(None)
+        toYear: int = Query(None),
+        limit: int = Query(None, ge=1),
+        after: int = Query(None),
+        stream: bool = Query(False)
 ) -> list[ResponseCar]:
-    return get_cars(carMake, garageId, fromYear, toYear)
+    not_modified = check_etag(request, response, 'car', 'car_garage', 'garage')
+    if not_modified:
+        return not_modified
+    if stream:
+        return StreamingResponse(stream_cars(carMake, garageId, fromYear, toYear, limit, after), media_type='application/x-ndjson', headers=etag_headers(response))
+    return trusted_response(await get_cars_async(carMake, garageId, fromYear, toYear, limit, after), response)
 
 
 @car_router.post('/', response_model=ResponseCar)
@@ -23,10 +38,24 @@ def create_single_car(request: CreateCar):
     except HTTPException as e:
         raise e
 
+@car_router.post('/bulk', response_model=list[ResponseBulkResult])
+async def create_bulk_cars(request: Request, batchSize: int = Query(1000, ge=1, le=10000)):
+    body = (await request.body()).decode('utf-8-sig')
+    if request.headers.get('content-type', '').startswith('text/csv'):
+        rows = parse_cars_csv(body)
+    else:
+        try:
+            rows = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body should be a JSON array or CSV")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Body should be a JSON array or CSV")
+    return await run_in_threadpool(create_cars, rows, batchSize)
+
 @car_router.get('/{id}', response_model=ResponseCar)
-def get_single_car(id: int):
+async def get_single_car(id: int):
     try:
-        return get_car(id)
+        return await get_car_async(id)
     except ValueError:
         raise HTTPException(status_code=404, detail='Car not found')
 
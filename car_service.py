@@ -1,16 +1,32 @@
-from database import Session
-from dtos import CreateCar, ResponseCar, UpdateCar
-from garage_service import map_garage_to_response, garage_capacity
-from model import Car, Garage
-from sqlalchemy.orm import Session as ORMSession
+import csv
+import io
+from typing import Callable, Iterator
+from pydantic import ValidationError
+from cache import cache, bump_versions
+from database import Session, AsyncSession, STREAM_CHUNK_SIZE
+from dtos import CreateCar, ResponseCar, UpdateCar, ResponseBulkResult
+from garage_service import map_garage_to_response, get_garage_occupancies, adjust_occupancy
+from model import Car, Maintenance, car_garage
+from serialization import build, dumps, row_factory
+from sqlalchemy import Select, delete, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession as AsyncORMSession
+from sqlalchemy.orm import Session as ORMSession, selectinload
 from fastapi import HTTPException
 
+IN_CHUNK_SIZE = 10000
+
 def get_car_by_id(id: int, session: ORMSession) -> Car:
     car = session.get(Car, id)
     if car is None:
         raise HTTPException(status_code=404, detail='Car not found')
     return car
 
+async def get_car_by_id_async(id: int, session: AsyncORMSession) -> Car:
+    car = await session.get(Car, id, options=[selectinload(Car.garages)])
+    if car is None:
+        raise HTTPException(status_code=404, detail='Car not found')
+    return car
+
 def create_car(request: CreateCar) -> ResponseCar:
     if any(char.isdigit() for char in request.make):
         raise HTTPException(status_code=400, detail="Make should not contain digits")
@@ -18,62 +34,179 @@ def create_car(request: CreateCar) -> ResponseCar:
     if not isinstance(request.productionYear, int):
         raise HTTPException(status_code=400, detail="Year should be an integer")
 
-    new_car = map_request_to_car(request)
+    check_garage_ids(request.garageIds)
+    garageIds = list(dict.fromkeys(request.garageIds))
+    values = map_request_to_values(request)
     with Session() as session:
-        existing_car = session.query(Car).filter_by(licensePlate=request.licensePlate).first()
-        if existing_car:
+        if session.scalar(select(Car.id).where(Car.licensePlate == request.licensePlate)) is not None:
             raise HTTPException(status_code=400, detail=f"License plate {request.licensePlate} is already taken")
 
-        session.add(new_car)
+        check_garage_capacity(garageIds, get_garage_occupancies(set(garageIds), session))
+
+        carId = session.execute(insert(Car).values(**values)).inserted_primary_key[0]
+        link_garages(carId, garageIds, session)
         session.commit()
-        session.refresh(new_car)
 
-        if request.garageIds:
-            for garageId in request.garageIds:
-                if not str(garageId).isdigit():
-                    raise HTTPException(status_code=400, detail=f"Garage ID {garageId} should contain digits only")
+    bump_versions('car', 'car_garage')
+    return build(ResponseCar, id=carId, **values)
+
+def create_cars(rows: list[dict], batchSize: int = 1000) -> list[ResponseBulkResult]:
+    results = {}
+    requests = {}
+    for index, row in enumerate(rows):
+        try:
+            request = CreateCar.model_validate(row)
+        except ValidationError as e:
+            results[index] = ResponseBulkResult(row=index, status='rejected', detail=str(e.errors()[0]['msg']))
+            continue
+        if any(char.isdigit() for char in request.make):
+            results[index] = ResponseBulkResult(row=index, status='rejected', detail="Make should not contain digits")
+            continue
+        requests[index] = request
 
-                garage = session.get(Garage, garageId)
-                if not garage:
-                    raise HTTPException(status_code=404, detail=f"Garage with id {garageId} not found")
+    with Session() as session:
+        plates = {request.licensePlate for request in requests.values()}
+        taken = set()
+        for chunk in chunked(list(plates), IN_CHUNK_SIZE):
+            taken.update(session.scalars(select(Car.licensePlate).where(Car.licensePlate.in_(chunk))))
 
-                current_capacity = garage_capacity(garageId, session)
-                if current_capacity >= garage.capacity:
-                    raise HTTPException(status_code=400, detail=f"Garage {garage.name} is full")
+        garageIds = {garageId for request in requests.values() for garageId in request.garageIds}
+        garages = get_garage_occupancies(garageIds, session)
+        occupancies = {garageId: garage['occupancy'] for garageId, garage in garages.items()}
 
-                new_car.garages.append(garage)
+        accepted = {}
+        for index, request in requests.items():
+            detail = None
+            if request.licensePlate in taken:
+                detail = f"License plate {request.licensePlate} is already taken"
+            else:
+                for garageId in dict.fromkeys(request.garageIds):
+                    if garageId not in garages:
+                        detail = f"Garage with id {garageId} not found"
+                        break
+                    if garages[garageId]['occupancy'] >= garages[garageId]['capacity']:
+                        detail = f"Garage {garages[garageId]['name']} is full"
+                        break
 
+            if detail:
+                results[index] = ResponseBulkResult(row=index, status='rejected', detail=detail)
+                continue
+
+            taken.add(request.licensePlate)
+            for garageId in dict.fromkeys(request.garageIds):
+                garages[garageId]['occupancy'] += 1
+            accepted[index] = request
+
+        for batch in chunked(list(accepted.items()), batchSize):
+            session.execute(insert(Car), [
+                {
+                    'make': request.make,
+                    'model': request.model,
+                    'productionYear': request.productionYear,
+                    'licensePlate': request.licensePlate
+                }
+                for _, request in batch
+            ])
+            ids = dict(session.execute(
+                select(Car.licensePlate, Car.id).where(Car.licensePlate.in_([request.licensePlate for _, request in batch]))
+            ).all())
+
+            links = [
+                {'carId': ids[request.licensePlate], 'garageId': garageId}
+                for _, request in batch for garageId in dict.fromkeys(request.garageIds)
+            ]
+            if links:
+                session.execute(insert(car_garage), links)
+
+            for index, request in batch:
+                results[index] = ResponseBulkResult(row=index, status='created', id=ids[request.licensePlate])
+
+        adjust_occupancy({garageId: garage['occupancy'] - occupancies[garageId] for garageId, garage in garages.items()}, session)
         session.commit()
-        session.refresh(new_car)
-        return map_car_to_response(new_car)
+
+    bump_versions('car', 'car_garage')
+    return [results[index] for index in sorted(results)]
+
+def parse_cars_csv(content: str) -> list[dict]:
+    rows = []
+    for row in csv.DictReader(io.StringIO(content)):
+        garageIds = (row.get('garageIds') or '').replace(';', ' ').split()
+        rows.append({**row, 'garageIds': garageIds})
+    return rows
+
+def chunked(items: list, size: int) -> Iterator[list]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
 
 def get_car(id: int) -> ResponseCar:
+    cached, generation = cache.get('car', id, ResponseCar)
+    if cached:
+        return cached
     with Session() as session:
         car = get_car_by_id(id, session)
-        return map_car_to_response(car)
+        response = map_car_to_response(car)
+    cache.set('car', id, response, generation)
+    return response
+
+async def get_car_async(id: int) -> ResponseCar:
+    cached, generation = await cache.get_async('car', id, ResponseCar)
+    if cached:
+        return cached
+    async with AsyncSession() as session:
+        car = await get_car_by_id_async(id, session)
+        response = map_car_to_response(car)
+    await cache.set_async('car', id, response, generation)
+    return response
+
+def get_cars(carMake: str = None, garageId: int = None, fromYear: int = None, toYear: int = None, limit: int = None, after: int = None) -> list[ResponseCar]:
+    with Session() as session:
+        rows = session.execute(select_cars(carMake, garageId, fromYear, toYear, limit, after)).all()
+        factory = row_factory()
+        return [map_car_row_to_response(row, factory) for row in rows]
 
-def get_cars(carMake: str = None, garageId: int = None, fromYear: int = None, toYear: int = None) -> list[ResponseCar]:
+async def get_cars_async(carMake: str = None, garageId: int = None, fromYear: int = None, toYear: int = None, limit: int = None, after: int = None) -> list[ResponseCar]:
+    async with AsyncSession() as session:
+        rows = (await session.execute(select_cars(carMake, garageId, fromYear, toYear, limit, after))).all()
+        factory = row_factory()
+        return [map_car_row_to_response(row, factory) for row in rows]
+
+def stream_cars(carMake: str = None, garageId: int = None, fromYear: int = None, toYear: int = None, limit: int = None, after: int = None) -> Iterator[bytes]:
     with Session() as session:
-        query = session.query(Car)
+        statement = select_cars(carMake, garageId, fromYear, toYear, limit, after)
+        factory = row_factory()
+        for row in session.execute(statement.execution_options(yield_per=STREAM_CHUNK_SIZE)):
+            yield dumps(map_car_row_to_response(row, factory)) + b'\n'
+
+def select_cars(carMake: str = None, garageId: int = None, fromYear: int = None, toYear: int = None, limit: int = None, after: int = None) -> Select:
+    statement = select(Car.id, Car.make, Car.model, Car.productionYear, Car.licensePlate)
 
-        if carMake:
-            query = query.filter(Car.make == carMake)
+    if carMake:
+        statement = statement.where(Car.make == carMake)
 
-        if garageId:
-            query = query.join(Car.garages).filter(Garage.id == garageId)
+    if garageId:
+        statement = statement.join(car_garage, car_garage.c.carId == Car.id).where(car_garage.c.garageId == garageId)
 
-        if fromYear:
-            query = query.filter(Car.productionYear >= fromYear)
+    if fromYear:
+        statement = statement.where(Car.productionYear >= fromYear)
 
-        if toYear:
-            query = query.filter(Car.productionYear <= toYear)
+    if toYear:
+        statement = statement.where(Car.productionYear <= toYear)
 
-        cars = query.all()
-        return [map_car_to_response(car) for car in cars]
+    if after is not None:
+        statement = statement.where(Car.id > after)
+
+    statement = statement.order_by(Car.id)
+    if limit:
+        statement = statement.limit(limit)
+    return statement
 
 def update_car(id: int, request: UpdateCar) -> ResponseCar:
     with Session() as session:
-        car = get_car_by_id(id, session)
+        cars = session.execute(
+            select(Car.id, Car.licensePlate).where(or_(Car.id == id, Car.licensePlate == request.licensePlate))
+        ).all()
+        if not any(carId == id for carId, _ in cars):
+            raise HTTPException(status_code=404, detail='Car not found')
 
         if any(char.isdigit() for char in request.make):
             raise HTTPException(status_code=400, detail="Make should not contain digits")
@@ -81,57 +214,84 @@ def update_car(id: int, request: UpdateCar) -> ResponseCar:
         if not isinstance(request.productionYear, int):
             raise HTTPException(status_code=400, detail="Year should be an integer")
 
-        existing_car = session.query(Car).filter_by(licensePlate=request.licensePlate).first()
-        if existing_car and existing_car.id != id:
+        if any(carId != id and licensePlate == request.licensePlate for carId, licensePlate in cars):
             raise HTTPException(status_code=400, detail=f"License plate {request.licensePlate} is already taken")
 
-        car.make = request.make
-        car.model = request.model
-        car.productionYear = request.productionYear
-        car.licensePlate = request.licensePlate
+        check_garage_ids(request.garageIds)
+        garageIds = list(dict.fromkeys(request.garageIds))
+        linked = set(session.scalars(select(car_garage.c.garageId).where(car_garage.c.carId == id)))
+        added = [garageId for garageId in garageIds if garageId not in linked]
+        removed = linked - set(garageIds)
 
-        car.garages.clear()
+        garages = get_garage_occupancies(set(added) | removed, session)
+        check_garage_capacity(added, garages)
 
-        if request.garageIds:
-            for garageId in request.garageIds:
-                if not str(garageId).isdigit():
-                    raise HTTPException(status_code=400, detail=f"Garage ID {garageId} should contain digits only")
+        values = map_request_to_values(request)
+        session.execute(update(Car).where(Car.id == id).values(**values))
+        if removed:
+            session.execute(delete(car_garage).where(car_garage.c.carId == id, car_garage.c.garageId.in_(removed)))
+        link_garages(id, added, session, {garageId: -1 for garageId in removed})
 
-                garage = session.get(Garage, garageId)
-                if not garage:
-                    raise HTTPException(status_code=404, detail=f"Garage with id {garageId} not found")
+        maintenanceIds = session.scalars(select(Maintenance.id).where(Maintenance.carId == id)).all()
+        session.commit()
 
-                current_capacity = garage_capacity(garageId, session)
-                if current_capacity >= garage.capacity:
-                    raise HTTPException(status_code=400, detail=f"Garage {garage.name} is full")
+    invalidate_car(id, maintenanceIds)
+    return build(ResponseCar, id=id, **values)
 
-                car.garages.append(garage)
+def check_garage_ids(garageIds: list[int]) -> None:
+    for garageId in garageIds:
+        if not str(garageId).isdigit():
+            raise HTTPException(status_code=400, detail=f"Garage ID {garageId} should contain digits only")
 
-        session.commit()
-        session.refresh(car)
-        return map_car_to_response(car)
+def check_garage_capacity(garageIds: list[int], garages: dict[int, dict]) -> None:
+    for garageId in garageIds:
+        garage = garages.get(garageId)
+        if not garage:
+            raise HTTPException(status_code=404, detail=f"Garage with id {garageId} not found")
+
+        if garage['occupancy'] >= garage['capacity']:
+            raise HTTPException(status_code=400, detail=f"Garage {garage['name']} is full")
+
+def link_garages(carId: int, garageIds: list[int], session: ORMSession, deltas: dict[int, int] = None) -> None:
+    if garageIds:
+        session.execute(insert(car_garage), [{'carId': carId, 'garageId': garageId} for garageId in garageIds])
+    adjust_occupancy({**(deltas or {}), **{garageId: 1 for garageId in garageIds}}, session)
 
 def delete_car(id: int) -> ResponseCar:
     with Session() as session:
         car = get_car_by_id(id, session)
+        garageIds = {garage.id for garage in car.garages}
+        get_garage_occupancies(garageIds, session)
+        adjust_occupancy({garageId: -1 for garageId in garageIds}, session)
+        maintenanceIds = session.scalars(select(Maintenance.id).where(Maintenance.carId == id)).all()
         session.delete(car)
         session.commit()
+        invalidate_car(id, maintenanceIds)
         return map_car_to_response(car)
 
-def map_car_to_response(car: Car) -> ResponseCar:
-    return ResponseCar(
+def invalidate_car(id: int, maintenanceIds: list[int]) -> None:
+    cache.invalidate('car', id)
+    cache.invalidate('maintenance', *maintenanceIds)
+    bump_versions('car', 'car_garage', 'maintenance')
+
+def map_car_to_response(car: Car, factory: Callable = build) -> ResponseCar:
+    return factory(
+        ResponseCar,
         id=car.id,
         make=car.make,
         model=car.model,
         productionYear=car.productionYear,
         licensePlate=car.licensePlate,
-        garages=[map_garage_to_response(garage) for garage in car.garages]
+        garages=[map_garage_to_response(garage, factory) for garage in car.garages]
     )
 
-def map_request_to_car(request: CreateCar) -> Car:
-    return Car(
-        make=request.make,
-        model=request.model,
-        productionYear=request.productionYear,
-        licensePlate=request.licensePlate
-    )
+def map_car_row_to_response(row, factory: Callable = build) -> ResponseCar:
+    return factory(ResponseCar, **row._mapping)
+
+def map_request_to_values(request: CreateCar | UpdateCar) -> dict:
+    return {
+        'make': request.make,
+        'model': request.model,
+        'productionYear': request.productionYear,
+        'licensePlate': request.licensePlate
+    }
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 from datetime import date
 
 class UpdateMaintenance(BaseModel):
@@ -45,6 +45,12 @@ class ResponseCar(BaseModel):
     licensePlate: str = Field(..., min_length=2)
     garageIds: List[ResponseGarage] = []
 
+class ResponseBulkResult(BaseModel):
+    row: int
+    status: str
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
 class CreateMaintenance(BaseModel):
     garageId: int
     carId: int
@@ -72,9 +78,48 @@ class monthlyRequestsReport(BaseModel):
     yearMonth: YearMonth
     requests: int = Field(..., ge=0)
 
+class garageMonthlyRequestsReport(BaseModel):
+    garageId: int
+    report: List[monthlyRequestsReport]
+
 class dailyAvailabilityReport(BaseModel):
     date: date
     requests: int = Field(..., ge=0)
     availableCapacity: int = Field(..., ge=0)
 
+class garageDailyAvailabilityReport(BaseModel):
+    garageId: int
+    report: List[dailyAvailabilityReport]
 
+class availableGarage(BaseModel):
+    garageId: int
+    garageName: str
+    availableCapacity: int = Field(..., ge=1)
+
+class nextAvailableDay(BaseModel):
+    date: date
+    availableCapacity: int = Field(..., ge=1)
+    garages: List[availableGarage]
+
+class cityLoadStats(BaseModel):
+    city: str
+    garages: int = Field(..., ge=1)
+    requests: int = Field(..., ge=0)
+    p50Utilization: float
+    p90Utilization: float
+    p99Utilization: float
+    peakDay: date
+    peakRequests: int = Field(..., ge=0)
+
+class serviceTypeShare(BaseModel):
+    serviceType: str
+    requests: int = Field(..., ge=0)
+    share: float = Field(..., ge=0, le=1)
+
+class fleetAnalyticsReport(BaseModel):
+    startDate: date
+    endDate: date
+    requests: int = Field(..., ge=0)
+    averageLeadTimeDays: Optional[float] = None
+    cities: List[cityLoadStats]
+    serviceTypes: List[serviceTypeShare]
@@ -0,0 +1,44 @@
+import hashlib
+import os
+from datetime import date
+from typing import Optional
+from fastapi import Request, Response
+from cache import get_versions, versions_shared
+
+PROCESS_TOKEN = os.urandom(8).hex()
+ETAGS = os.getenv('ETAGS', 'auto').lower()
+
+
+def etags_enabled() -> bool:
+    if ETAGS == 'auto':
+        return versions_shared()
+    return ETAGS in ('1', 'true', 'yes', 'on')
+
+
+def compute_etag(request: Request, tables: tuple[str, ...]) -> str:
+    versions = ','.join(map(str, get_versions(*tables)))
+    query = '&'.join(sorted(f'{key}={value}' for key, value in request.query_params.multi_items()))
+    digest = hashlib.sha1(f'{PROCESS_TOKEN}|{date.today()}|{versions}|{request.url.path}|{query}'.encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def matches(request: Request, etag: str) -> bool:
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    candidates = {candidate.strip().removeprefix('W/') for candidate in header.split(',')}
+    return '*' in candidates or etag in candidates
+
+
+def check_etag(request: Request, response: Response, *tables: str) -> Optional[Response]:
+    if not etags_enabled():
+        return None
+    etag = compute_etag(request, tables)
+    if matches(request, etag):
+        return Response(status_code=304, headers={'ETag': etag})
+    response.headers['ETag'] = etag
+    return None
+
+
+def etag_headers(response: Response) -> Optional[dict[str, str]]:
+    return {'ETag': response.headers['ETag']} if 'ETag' in response.headers else None
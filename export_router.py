@@ -0,0 +1,18 @@
+from datetime import datetime
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from export_service import EXPORT_MEDIA_TYPES, check_export_format, get_export_table, get_export_watermark, stream_export
+
+export_router = APIRouter()
+
+@export_router.get('/{entity}')
+def export_entity(entity: str, format: str = Query('csv'), after: int = Query(None), updatedSince: datetime = Query(None)) -> StreamingResponse:
+    get_export_table(entity)
+    check_export_format(format)
+    watermark = get_export_watermark(entity, after, updatedSince)
+    headers = {'Content-Disposition': f'attachment; filename="{entity}.{format}"'}
+    if watermark['maxId']:
+        headers['X-Export-Max-Id'] = watermark['maxId']
+    if watermark['updatedAt']:
+        headers['X-Export-Updated-At'] = watermark['updatedAt']
+    return StreamingResponse(stream_export(entity, format, after, updatedSince), media_type=EXPORT_MEDIA_TYPES[format], headers=headers)
@@ -0,0 +1,148 @@
+import csv
+import io
+from datetime import datetime
+from typing import Iterator, Optional
+from database import Session
+from model import Car, Garage, Maintenance
+from sqlalchemy import Date, DateTime, Integer, Select, func, or_, select
+from fastapi import HTTPException
+
+EXPORT_CHUNK_SIZE = 10000
+
+EXPORT_TABLES = {
+    'cars': Car.__table__,
+    'garages': Garage.__table__,
+    'maintenances': Maintenance.__table__
+}
+
+EXPORT_MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+def get_export_table(entity: str):
+    table = EXPORT_TABLES.get(entity)
+    if table is None:
+        raise HTTPException(status_code=404, detail=f"Unknown export entity {entity}")
+    return table
+
+def check_export_format(format: str) -> None:
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Export format should be one of {', '.join(EXPORT_MEDIA_TYPES)}")
+    if format in ('arrow', 'parquet'):
+        try:
+            import pyarrow
+        except ImportError:
+            raise HTTPException(status_code=501, detail=f"{format} export requires pyarrow")
+
+def select_export(entity: str, after: int = None, updatedSince: datetime = None) -> Select:
+    table = get_export_table(entity)
+    statement = select(table)
+
+    conditions = []
+    if after is not None:
+        conditions.append(table.c.id > after)
+
+    if updatedSince is not None:
+        conditions.append(table.c.updatedAt >= updatedSince)
+
+    if conditions:
+        statement = statement.where(or_(*conditions))
+
+    return statement.order_by(table.c.id)
+
+def get_export_watermark(entity: str, after: int = None, updatedSince: datetime = None) -> dict[str, Optional[str]]:
+    table = get_export_table(entity)
+    statement = select_export(entity, after, updatedSince).order_by(None).with_only_columns(
+        func.max(table.c.id), func.max(table.c.updatedAt)
+    )
+    with Session() as session:
+        maxId, updatedAt = session.execute(statement).one()
+    if after is not None and (maxId is None or maxId < after):
+        maxId = after
+    if updatedSince is not None and (updatedAt is None or updatedAt < updatedSince):
+        updatedAt = updatedSince
+    return {
+        'maxId': str(maxId) if maxId is not None else None,
+        'updatedAt': updatedAt.isoformat() if updatedAt is not None else None
+    }
+
+def stream_export(entity: str, format: str, after: int = None, updatedSince: datetime = None) -> Iterator[bytes]:
+    check_export_format(format)
+    table = get_export_table(entity)
+    writer = {'csv': write_csv, 'arrow': write_arrow, 'parquet': write_parquet}[format]
+    with Session() as session:
+        result = session.execute(select_export(entity, after, updatedSince).execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        yield from writer(table, result.partitions())
+
+def write_csv(table, chunks) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(table.c.keys())
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def write_arrow(table, chunks) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    schema = arrow_schema(table)
+    sink = ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for chunk in chunks:
+            writer.write_batch(arrow_batch(schema, chunk))
+            yield sink.drain()
+    yield sink.drain()
+
+def write_parquet(table, chunks) -> Iterator[bytes]:
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(table)
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in chunks:
+            writer.write_batch(arrow_batch(schema, chunk))
+            yield sink.drain()
+    yield sink.drain()
+
+def arrow_schema(table):
+    import pyarrow as pa
+
+    types = [(Integer, pa.int64()), (DateTime, pa.timestamp('us')), (Date, pa.date32())]
+    return pa.schema([
+        pa.field(column.name, next((arrow_type for sql_type, arrow_type in types if isinstance(column.type, sql_type)), pa.string()), nullable=column.nullable)
+        for column in table.c
+    ])
+
+def arrow_batch(schema, rows: list):
+    import pyarrow as pa
+
+    columns = list(zip(*rows)) if rows else [() for _ in schema]
+    return pa.record_batch([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+class ChunkSink(io.RawIOBase):
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
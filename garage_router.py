@@ -1,21 +1,52 @@
 from datetime import date
-from fastapi import APIRouter, HTTPException,Query
+from fastapi import APIRouter, HTTPException,Query, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import List
-from dtos import CreateGarage, UpdateGarage, ResponseGarage, dailyAvailabilityReport
-from garage_service import create_garage, get_garage, get_garages, update_garage, delete_garage, get_daily_availability_report
+from dtos import CreateGarage, UpdateGarage, ResponseGarage, dailyAvailabilityReport, garageDailyAvailabilityReport, nextAvailableDay
+from etag import check_etag, etag_headers
+from serialization import trusted_response
+from garage_service import create_garage, get_garage_async, get_garages_async, stream_garages, update_garage, delete_garage, get_daily_availability_report_async, get_daily_availability_reports_async, get_next_available_days_async
 
 garage_router = APIRouter()
 
+def parse_ids(ids: str) -> list[int]:
+    try:
+        return [int(id) for id in ids.split(',') if id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="IDs should be a comma separated list of digits")
+
 @garage_router.get('/dailyAvailabilityReport', response_model=List[dailyAvailabilityReport])
-def get_garage_daily_availability(garageId: int = Query(...), startDate: date = Query(...), endDate: date = Query(...)) -> List[dailyAvailabilityReport]:
+async def get_garage_daily_availability(request: Request, response: Response, garageId: int = Query(...), startDate: date = Query(...), endDate: date = Query(...)) -> List[dailyAvailabilityReport]:
+    not_modified = check_etag(request, response, 'garage', 'maintenance')
+    if not_modified:
+        return not_modified
     try:
-        return get_daily_availability_report(garageId, startDate, endDate)
+        return await get_daily_availability_report_async(garageId, startDate, endDate)
     except ValueError:
         raise HTTPException(status_code=404, detail='Garage not found')
 
+@garage_router.get('/dailyAvailabilityReports', response_model=List[garageDailyAvailabilityReport])
+async def get_garages_daily_availability(request: Request, response: Response, garageIds: str = Query(...), startDate: date = Query(...), endDate: date = Query(...)) -> List[garageDailyAvailabilityReport]:
+    not_modified = check_etag(request, response, 'garage', 'maintenance')
+    if not_modified:
+        return not_modified
+    return await get_daily_availability_reports_async(parse_ids(garageIds), startDate, endDate)
+
+@garage_router.get('/nextAvailable', response_model=List[nextAvailableDay])
+async def get_next_available_days_in_city(request: Request, response: Response, city: str = Query(...), count: int = Query(1, ge=1, le=366), fromDate: date = Query(..., alias='from')) -> List[nextAvailableDay]:
+    not_modified = check_etag(request, response, 'garage', 'maintenance')
+    if not_modified:
+        return not_modified
+    return await get_next_available_days_async(city, count, fromDate)
+
 @garage_router.get('/', response_model=list[ResponseGarage])
-def get_garages_by_city(city: str = Query(None)) -> list[ResponseGarage]:
-    return get_garages(city)
+async def get_garages_by_city(request: Request, response: Response, city: str = Query(None), limit: int = Query(None, ge=1), after: int = Query(None), stream: bool = Query(False)) -> list[ResponseGarage]:
+    not_modified = check_etag(request, response, 'garage')
+    if not_modified:
+        return not_modified
+    if stream:
+        return StreamingResponse(stream_garages(city, limit, after), media_type='application/x-ndjson', headers=etag_headers(response))
+    return trusted_response(await get_garages_async(city, limit, after), response)
 
 @garage_router.post('/', response_model=ResponseGarage)
 def create_single_garage(request: CreateGarage):
@@ -25,9 +56,9 @@ def create_single_garage(request: CreateGarage):
         raise HTTPException(status_code=404, detail='Garage not created')
 
 @garage_router.get('/{id}', response_model=ResponseGarage)
-def get_single_garage(id: int):
+async def get_single_garage(id: int):
     try:
-        return get_garage(id)
+        return await get_garage_async(id)
     except ValueError:
         raise HTTPException(status_code=404, detail='Garage not found')
 
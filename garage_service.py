@@ -1,7 +1,16 @@
 from datetime import date, timedelta
-from database import Session
-from dtos import CreateGarage, UpdateGarage, ResponseGarage, dailyAvailabilityReport
-from model import Garage, Maintenance, car_garage
+from typing import Callable, Iterator
+import availability
+from cache import cache, bump_versions
+from database import Session, AsyncSession, STREAM_CHUNK_SIZE
+from dtos import CreateGarage, UpdateGarage, ResponseGarage, dailyAvailabilityReport, garageDailyAvailabilityReport, availableGarage, nextAvailableDay
+from model import Garage, GarageDailyLoad, Maintenance, car_garage
+from serialization import build, dumps, row_factory
+from sqlalchemy import Select, bindparam, delete, func, insert, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession as AsyncORMSession
 from sqlalchemy.orm import Session as ORMSession
 from fastapi import HTTPException
 
@@ -11,6 +20,12 @@ def get_garage_by_id(id: int, session: ORMSession) -> Garage:
         raise HTTPException(status_code=404, detail='Garage not found')
     return garage
 
+async def get_garage_by_id_async(id: int, session: AsyncORMSession) -> Garage:
+    garage = await session.get(Garage, id)
+    if garage is None:
+        raise HTTPException(status_code=404, detail='Garage not found')
+    return garage
+
 def create_garage(request: CreateGarage) -> ResponseGarage:
     if any(char.isdigit() for char in request.name):
         raise HTTPException(status_code=400, detail="Name should not contain digits")
@@ -25,21 +40,60 @@ def create_garage(request: CreateGarage) -> ResponseGarage:
     with Session() as session:
         session.add(new_garage)
         session.commit()
+        bump_versions('garage')
         session.refresh(new_garage)
+        availability.set_garage(new_garage.id, new_garage.name, new_garage.city, new_garage.capacity)
         return map_garage_to_response(new_garage)
 
 def get_garage(id: int) -> ResponseGarage:
+    cached, generation = cache.get('garage', id, ResponseGarage)
+    if cached:
+        return cached
     with Session() as session:
         garage = get_garage_by_id(id, session)
-        return map_garage_to_response(garage)
+        response = map_garage_to_response(garage)
+    cache.set('garage', id, response, generation)
+    return response
+
+async def get_garage_async(id: int) -> ResponseGarage:
+    cached, generation = await cache.get_async('garage', id, ResponseGarage)
+    if cached:
+        return cached
+    async with AsyncSession() as session:
+        garage = await get_garage_by_id_async(id, session)
+        response = map_garage_to_response(garage)
+    await cache.set_async('garage', id, response, generation)
+    return response
 
-def get_garages(city: str = None) -> list[ResponseGarage]:
+def get_garages(city: str = None, limit: int = None, after: int = None) -> list[ResponseGarage]:
     with Session() as session:
-        query = session.query(Garage)
-        if city:
-            query = query.filter(Garage.city == city)
-        garages = query.all()
-        return [map_garage_to_response(garage) for garage in garages]
+        rows = session.execute(select_garages(city, limit, after)).all()
+        factory = row_factory()
+        return [map_garage_to_response(row, factory) for row in rows]
+
+async def get_garages_async(city: str = None, limit: int = None, after: int = None) -> list[ResponseGarage]:
+    async with AsyncSession() as session:
+        rows = (await session.execute(select_garages(city, limit, after))).all()
+        factory = row_factory()
+        return [map_garage_to_response(row, factory) for row in rows]
+
+def stream_garages(city: str = None, limit: int = None, after: int = None) -> Iterator[bytes]:
+    with Session() as session:
+        statement = select_garages(city, limit, after)
+        factory = row_factory()
+        for row in session.execute(statement.execution_options(yield_per=STREAM_CHUNK_SIZE)):
+            yield dumps(map_garage_to_response(row, factory)) + b'\n'
+
+def select_garages(city: str = None, limit: int = None, after: int = None) -> Select:
+    statement = select(Garage.id, Garage.name, Garage.location, Garage.city, Garage.capacity)
+    if city:
+        statement = statement.where(Garage.city == city)
+    if after is not None:
+        statement = statement.where(Garage.id > after)
+    statement = statement.order_by(Garage.id)
+    if limit:
+        statement = statement.limit(limit)
+    return statement
 
 def update_garage(id: int, request: UpdateGarage) -> ResponseGarage:
     with Session() as session:
@@ -57,19 +111,38 @@ def update_garage(id: int, request: UpdateGarage) -> ResponseGarage:
         garage.location = request.location
         garage.city = request.city
         garage.capacity = request.capacity
+        dependents = get_garage_dependents(id, session)
         session.commit()
+        invalidate_garage(id, *dependents)
+        availability.set_garage(id, request.name, request.city, request.capacity)
         session.refresh(garage)
         return map_garage_to_response(garage)
 
 def delete_garage(id: int) -> ResponseGarage:
     with Session() as session:
         garage = get_garage_by_id(id, session)
+        dependents = get_garage_dependents(id, session)
+        session.execute(delete(GarageDailyLoad).where(GarageDailyLoad.garageId == id))
         session.delete(garage)
         session.commit()
+        invalidate_garage(id, *dependents)
+        availability.remove_garage(id)
         return map_garage_to_response(garage)
 
-def map_garage_to_response(garage: Garage) -> ResponseGarage:
-    return ResponseGarage(
+def get_garage_dependents(id: int, session: ORMSession) -> tuple[list[int], list[int]]:
+    carIds = session.scalars(select(car_garage.c.carId).where(car_garage.c.garageId == id)).all()
+    maintenanceIds = session.scalars(select(Maintenance.id).where(Maintenance.garageId == id)).all()
+    return carIds, maintenanceIds
+
+def invalidate_garage(id: int, carIds: list[int], maintenanceIds: list[int]) -> None:
+    cache.invalidate('garage', id)
+    cache.invalidate('car', *carIds)
+    cache.invalidate('maintenance', *maintenanceIds)
+    bump_versions('garage', 'car_garage', 'maintenance')
+
+def map_garage_to_response(garage: Garage, factory: Callable = build) -> ResponseGarage:
+    return factory(
+        ResponseGarage,
         id=garage.id,
         name=garage.name,
         location=garage.location,
@@ -87,30 +160,279 @@ def map_request_to_garage(request: CreateGarage) -> Garage:
 
 
 def get_daily_availability_report(garageId: int, startDate: date, endDate: date) -> list[dailyAvailabilityReport]:
+    indexed = availability.daily_loads([garageId], startDate, endDate)
+    if indexed:
+        garages, loads = indexed
+        return build_daily_availability_report(garages[garageId], loads, startDate, endDate)
     with Session() as session:
         garage = get_garage_by_id(garageId, session)
-        if not garage:
-            raise HTTPException(status_code=404, detail='Garage not found')
+        loads = map_daily_loads(session.execute(select_daily_loads([garageId], startDate, endDate)))
+        return build_daily_availability_report(garage, loads, startDate, endDate)
+
+async def get_daily_availability_report_async(garageId: int, startDate: date, endDate: date) -> list[dailyAvailabilityReport]:
+    indexed = availability.daily_loads([garageId], startDate, endDate)
+    if indexed:
+        garages, loads = indexed
+        return build_daily_availability_report(garages[garageId], loads, startDate, endDate)
+    async with AsyncSession() as session:
+        garage = await get_garage_by_id_async(garageId, session)
+        loads = map_daily_loads(await session.execute(select_daily_loads([garageId], startDate, endDate)))
+        return build_daily_availability_report(garage, loads, startDate, endDate)
+
+def get_daily_availability_reports(garageIds: list[int], startDate: date, endDate: date) -> list[garageDailyAvailabilityReport]:
+    indexed = availability.daily_loads(garageIds, startDate, endDate)
+    if indexed:
+        return build_daily_availability_reports(garageIds, *indexed, startDate, endDate)
+    with Session() as session:
+        garages = map_found_garages(session.scalars(select(Garage).where(Garage.id.in_(garageIds))), garageIds)
+        loads = map_daily_loads(session.execute(select_daily_loads(garageIds, startDate, endDate)))
+        return build_daily_availability_reports(garageIds, garages, loads, startDate, endDate)
+
+async def get_daily_availability_reports_async(garageIds: list[int], startDate: date, endDate: date) -> list[garageDailyAvailabilityReport]:
+    indexed = availability.daily_loads(garageIds, startDate, endDate)
+    if indexed:
+        return build_daily_availability_reports(garageIds, *indexed, startDate, endDate)
+    async with AsyncSession() as session:
+        garages = map_found_garages(await session.scalars(select(Garage).where(Garage.id.in_(garageIds))), garageIds)
+        loads = map_daily_loads(await session.execute(select_daily_loads(garageIds, startDate, endDate)))
+        return build_daily_availability_reports(garageIds, garages, loads, startDate, endDate)
 
-        report = []
-        current_date = startDate
-        while current_date <= endDate:
-            maintenances = session.query(Maintenance).filter(
-                Maintenance.garageId == garageId,
-                Maintenance.scheduledDate == current_date
-            ).count()
+def get_next_available_days(city: str, count: int, fromDate: date) -> list[nextAvailableDay]:
+    indexed = availability.next_available(city, count, fromDate)
+    if indexed:
+        return build_next_available_days(*indexed)
+    with Session() as session:
+        garages = session.execute(select(Garage.id, Garage.name, Garage.capacity).where(Garage.city == city).order_by(Garage.id)).all()
+        if not garages:
+            raise HTTPException(status_code=404, detail=f"No garages found in {city}")
+        garages = bookable_garages(garages, city)
+        days = []
+        for startDate, endDate in available_day_windows(days, count, fromDate):
+            fullyBooked = set(session.scalars(select_fully_booked_days(city, len(garages), startDate, endDate)))
+            days.extend(day for day in date_range(startDate, endDate) if day not in fullyBooked)
+        days = days[:count]
+        loads = map_daily_loads(session.execute(select_daily_loads([garage.id for garage in garages], days[0], days[-1])))
+        return build_next_available_days(garages, loads, days)
 
-            available_capacity = garage.capacity - maintenances
-            report.append(dailyAvailabilityReport(
-                date=current_date,
-                requests=maintenances,
-                availableCapacity=available_capacity
-            ))
-            current_date += timedelta(days=1)
+async def get_next_available_days_async(city: str, count: int, fromDate: date) -> list[nextAvailableDay]:
+    indexed = availability.next_available(city, count, fromDate)
+    if indexed:
+        return build_next_available_days(*indexed)
+    async with AsyncSession() as session:
+        garages = (await session.execute(select(Garage.id, Garage.name, Garage.capacity).where(Garage.city == city).order_by(Garage.id))).all()
+        if not garages:
+            raise HTTPException(status_code=404, detail=f"No garages found in {city}")
+        garages = bookable_garages(garages, city)
+        days = []
+        for startDate, endDate in available_day_windows(days, count, fromDate):
+            fullyBooked = set(await session.scalars(select_fully_booked_days(city, len(garages), startDate, endDate)))
+            days.extend(day for day in date_range(startDate, endDate) if day not in fullyBooked)
+        days = days[:count]
+        loads = map_daily_loads(await session.execute(select_daily_loads([garage.id for garage in garages], days[0], days[-1])))
+        return build_next_available_days(garages, loads, days)
 
-        return report
+def select_fully_booked_days(city: str, garageCount: int, startDate: date, endDate: date) -> Select:
+    return select(
+        GarageDailyLoad.date
+    ).join(
+        Garage, Garage.id == GarageDailyLoad.garageId
+    ).where(
+        Garage.city == city,
+        GarageDailyLoad.date >= startDate,
+        GarageDailyLoad.date <= endDate,
+        Garage.capacity > 0,
+        GarageDailyLoad.requests >= Garage.capacity
+    ).group_by(
+        GarageDailyLoad.date
+    ).having(
+        func.count() == garageCount
+    ).order_by(GarageDailyLoad.date)
 
+def bookable_garages(garages: list, city: str) -> list:
+    garages = [garage for garage in garages if garage.capacity > 0]
+    if not garages:
+        raise HTTPException(status_code=404, detail=f"No garages with capacity found in {city}")
+    return garages
 
+def available_day_windows(days: list[date], count: int, fromDate: date) -> Iterator[tuple[date, date]]:
+    startDate, size = fromDate, count
+    while len(days) < count:
+        endDate = startDate + timedelta(days=size - 1)
+        yield startDate, endDate
+        startDate, size = endDate + timedelta(days=1), size * 2
+
+def date_range(startDate: date, endDate: date) -> Iterator[date]:
+    current_date = startDate
+    while current_date <= endDate:
+        yield current_date
+        current_date += timedelta(days=1)
+
+def build_next_available_days(garages: list, loads: dict[tuple[int, date], int], days: list[date]) -> list[nextAvailableDay]:
+    report = []
+    for day in days:
+        available = sorted(
+            ((capacity - loads.get((garageId, day), 0), garageId, name) for garageId, name, capacity in garages),
+            key=lambda garage: (-garage[0], garage[1])
+        )
+        available = [garage for garage in available if garage[0] > 0]
+        report.append(nextAvailableDay(
+            date=day,
+            availableCapacity=sum(capacity for capacity, _, _ in available),
+            garages=[availableGarage(garageId=garageId, garageName=name, availableCapacity=capacity) for capacity, garageId, name in available]
+        ))
+    return report
+
+def map_found_garages(garages, garageIds: list[int]) -> dict[int, Garage]:
+    found = {garage.id: garage for garage in garages}
+    for garageId in garageIds:
+        if garageId not in found:
+            raise HTTPException(status_code=404, detail=f"Garage with id {garageId} not found")
+    return found
+
+def select_daily_loads(garageIds: list[int], startDate: date, endDate: date) -> Select:
+    return select(
+        GarageDailyLoad.garageId,
+        GarageDailyLoad.date,
+        GarageDailyLoad.requests
+    ).where(
+        GarageDailyLoad.garageId.in_(garageIds),
+        GarageDailyLoad.date >= startDate,
+        GarageDailyLoad.date <= endDate
+    )
 
-def garage_capacity(garageId: int, session: Session) -> int:
-    return session.query(car_garage).filter_by(garageId=garageId).count()
+def adjust_daily_load(deltas: dict[tuple[int, date], int], session: ORMSession) -> None:
+    table = GarageDailyLoad.__table__
+    deltas = {key: delta for key, delta in deltas.items() if delta and None not in key}
+
+    increments = [{'garageId': garageId, 'date': day, 'requests': delta} for (garageId, day), delta in sorted(deltas.items()) if delta > 0]
+    if increments:
+        dialect = session.get_bind().dialect.name
+        if dialect == 'mysql':
+            statement = mysql_insert(table)
+            statement = statement.on_duplicate_key_update(requests=table.c.requests + statement.inserted.requests)
+            session.execute(statement, increments)
+        elif dialect in ('sqlite', 'postgresql'):
+            statement = (sqlite_insert if dialect == 'sqlite' else postgresql_insert)(table)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.garageId, table.c.date],
+                set_={'requests': table.c.requests + statement.excluded.requests}
+            )
+            session.execute(statement, increments)
+        else:
+            merge_daily_load(increments, session)
+
+    decrements = [{'garage_id': garageId, 'day': day, 'delta': delta} for (garageId, day), delta in sorted(deltas.items()) if delta < 0]
+    if decrements:
+        add_daily_load(decrements, session)
+
+def merge_daily_load(increments: list[dict], session: ORMSession) -> None:
+    table = GarageDailyLoad.__table__
+    existing = set(session.execute(
+        select(table.c.garageId, table.c.date)
+        .where(
+            table.c.garageId.in_({increment['garageId'] for increment in increments}),
+            table.c.date.in_({increment['date'] for increment in increments})
+        )
+        .with_for_update()
+    ).all())
+    updates = [
+        {'garage_id': increment['garageId'], 'day': increment['date'], 'delta': increment['requests']}
+        for increment in increments if (increment['garageId'], increment['date']) in existing
+    ]
+    if updates:
+        add_daily_load(updates, session)
+    inserts = [increment for increment in increments if (increment['garageId'], increment['date']) not in existing]
+    if inserts:
+        session.execute(insert(table), inserts)
+
+def add_daily_load(params: list[dict], session: ORMSession) -> None:
+    table = GarageDailyLoad.__table__
+    session.execute(
+        update(table)
+        .where(table.c.garageId == bindparam('garage_id'), table.c.date == bindparam('day'))
+        .values(requests=table.c.requests + bindparam('delta')),
+        params
+    )
+
+def rebuild_daily_load() -> int:
+    with Session() as session:
+        session.execute(delete(GarageDailyLoad))
+        session.execute(insert(GarageDailyLoad).from_select(
+            ['garageId', 'date', 'requests'],
+            select(Maintenance.garageId, Maintenance.scheduledDate, func.count(Maintenance.id))
+            .where(Maintenance.garageId.is_not(None), Maintenance.scheduledDate.is_not(None))
+            .group_by(Maintenance.garageId, Maintenance.scheduledDate)
+        ))
+        rows = session.scalar(select(func.count()).select_from(GarageDailyLoad))
+        session.commit()
+        return rows
+
+def map_daily_loads(rows) -> dict[tuple[int, date], int]:
+    return {(garageId, scheduledDate): requests for garageId, scheduledDate, requests in rows}
+
+def build_daily_availability_reports(garageIds: list[int], garages: dict[int, Garage], loads: dict[tuple[int, date], int], startDate: date, endDate: date) -> list[garageDailyAvailabilityReport]:
+    return [
+        garageDailyAvailabilityReport(
+            garageId=garageId,
+            report=build_daily_availability_report(garages[garageId], loads, startDate, endDate)
+        )
+        for garageId in dict.fromkeys(garageIds)
+    ]
+
+def build_daily_availability_report(garage: Garage, loads: dict[tuple[int, date], int], startDate: date, endDate: date) -> list[dailyAvailabilityReport]:
+    report = []
+    current_date = startDate
+    while current_date <= endDate:
+        maintenances = loads.get((garage.id, current_date), 0)
+        report.append(dailyAvailabilityReport(
+            date=current_date,
+            requests=maintenances,
+            availableCapacity=garage.capacity - maintenances
+        ))
+        current_date += timedelta(days=1)
+
+    return report
+
+def get_garage_occupancies(garageIds: set[int], session: ORMSession) -> dict[int, dict]:
+    if not garageIds:
+        return {}
+    rows = session.execute(
+        select(Garage.id, Garage.name, Garage.capacity, Garage.occupancy)
+        .where(Garage.id.in_(garageIds))
+        .order_by(Garage.id)
+        .with_for_update()
+    )
+    return {id: {'name': name, 'capacity': capacity, 'occupancy': occupancy} for id, name, capacity, occupancy in rows}
+
+def adjust_occupancy(deltas: dict[int, int], session: ORMSession) -> None:
+    params = [{'garage_id': garageId, 'delta': delta} for garageId, delta in sorted(deltas.items()) if delta]
+    if params:
+        session.execute(
+            update(Garage.__table__)
+            .where(Garage.__table__.c.id == bindparam('garage_id'))
+            .values(occupancy=Garage.__table__.c.occupancy + bindparam('delta')),
+            params
+        )
+
+def link_car_to_garage(carId: int, garageId: int, session: ORMSession) -> None:
+    linked = session.execute(
+        select(car_garage.c.carId).where(car_garage.c.carId == carId, car_garage.c.garageId == garageId)
+    ).first()
+    if not linked:
+        session.execute(insert(car_garage).values(carId=carId, garageId=garageId))
+        adjust_occupancy({garageId: 1}, session)
+
+def unlink_car_from_garage(carId: int, garageId: int, session: ORMSession) -> None:
+    result = session.execute(
+        delete(car_garage).where(car_garage.c.carId == carId, car_garage.c.garageId == garageId)
+    )
+    if result.rowcount:
+        adjust_occupancy({garageId: -result.rowcount}, session)
+
+def reconcile_occupancy() -> int:
+    with Session() as session:
+        counted = select(func.count()).select_from(car_garage).where(car_garage.c.garageId == Garage.id).scalar_subquery()
+        drifted = session.scalar(select(func.count()).select_from(Garage).where(Garage.occupancy != counted))
+        session.execute(update(Garage).values(occupancy=counted))
+        session.commit()
+        return drifted
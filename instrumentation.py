@@ -0,0 +1,96 @@
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from metrics import Counter, Histogram
+
+SLOW_QUERY_SECONDS = float(os.getenv('SLOW_QUERY_SECONDS', 0.5))
+
+logger = logging.getLogger('car_management.slow_query')
+
+request_duration = Histogram('http_request_duration_seconds', 'Request latency by route')
+request_statements = Histogram('http_request_db_statements', 'SQL statements issued per request by route', buckets=(1, 2, 3, 5, 10, 20, 50, 100, 250, 1000))
+db_statements = Counter('db_statements_total', 'SQL statements executed by route')
+db_time = Counter('db_time_seconds_total', 'Time spent executing SQL by route')
+db_rows = Counter('db_rows_total', 'Rows reported by the driver by route')
+slow_queries = Counter('db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_SECONDS by route')
+
+
+class RequestStats:
+    def __init__(self, scope):
+        self.scope = scope
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+
+    @property
+    def route(self) -> str:
+        return route_label(self.scope)
+
+
+current_stats: ContextVar[Optional[RequestStats]] = ContextVar('current_stats', default=None)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context.query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.query_started
+    stats = current_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += elapsed
+        stats.rows += max(cursor.rowcount, 0)
+
+    if elapsed >= SLOW_QUERY_SECONDS:
+        route = stats.route if stats else 'none'
+        slow_queries.inc(route=route)
+        logger.warning('Slow query (%.3fs, route=%s): %s', elapsed, route, ' '.join(statement.split()))
+
+
+def route_label(scope) -> str:
+    if scope.get('route') is None:
+        return 'unmatched'
+    names = {str(value): name for name, value in scope.get('path_params', {}).items()}
+    return '/'.join(f'{{{names[segment]}}}' if segment in names else segment for segment in scope['path'].split('/'))
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                elapsed = (time.perf_counter() - started) * 1000
+                timing = f'db;dur={stats.db_time * 1000:.2f};desc="{stats.statements} queries", app;dur={elapsed:.2f}'
+                message['headers'] = list(message.get('headers', [])) + [(b'server-timing', timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_stats.reset(token)
+            route = stats.route
+            request_duration.observe(time.perf_counter() - started, method=scope['method'], route=route, status=status)
+            request_statements.observe(stats.statements, route=route)
+            db_statements.inc(stats.statements, route=route)
+            db_time.inc(stats.db_time, route=route)
+            db_rows.inc(stats.rows, route=route)
@@ -0,0 +1,109 @@
+import glob
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from typing import Callable, Optional
+
+INVALIDATION_DIR = os.getenv('INVALIDATION_DIR')
+ACK_TIMEOUT = float(os.getenv('INVALIDATION_ACK_TIMEOUT', 2))
+MESSAGE_ITEMS = 500
+
+logger = logging.getLogger('car_management.invalidation')
+
+handlers: dict[str, Callable[[list], None]] = {}
+
+
+def subscribe(topic: str, handler: Callable[[list], None]) -> None:
+    handlers[topic] = handler
+
+
+class UnixSocketChannel:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, f'worker-{os.getpid()}.sock')
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(self.path)
+        self.thread = threading.Thread(target=self.listen, name='invalidation', daemon=True)
+        self.thread.start()
+
+    def listen(self) -> None:
+        while True:
+            try:
+                data, sender = self.socket.recvfrom(1 << 20)
+            except OSError:
+                return
+            try:
+                message = json.loads(data)
+                handlers[message['topic']](message['items'])
+            except Exception:
+                logger.exception('Failed to apply invalidation message')
+            if sender:
+                try:
+                    self.socket.sendto(b'ack', sender)
+                except OSError:
+                    pass
+
+    def peers(self) -> list[str]:
+        return [path for path in glob.glob(os.path.join(self.directory, 'worker-*.sock')) if path != self.path]
+
+    def publish(self, topic: str, items: list) -> None:
+        peers = self.peers()
+        if not peers or not items:
+            return
+        reply_path = os.path.join(self.directory, f'reply-{uuid.uuid4().hex}.sock')
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as reply:
+            reply.bind(reply_path)
+            reply.settimeout(ACK_TIMEOUT)
+            try:
+                for start in range(0, len(items), MESSAGE_ITEMS):
+                    data = json.dumps({'topic': topic, 'items': items[start:start + MESSAGE_ITEMS]}).encode()
+                    delivered = 0
+                    for peer in peers:
+                        try:
+                            reply.sendto(data, peer)
+                            delivered += 1
+                        except (ConnectionRefusedError, FileNotFoundError):
+                            remove_stale(peer)
+                    for _ in range(delivered):
+                        reply.recv(16)
+            except socket.timeout:
+                logger.warning('Timed out waiting for %s invalidation acknowledgements', topic)
+            finally:
+                os.unlink(reply_path)
+
+    def close(self) -> None:
+        self.socket.close()
+        remove_stale(self.path)
+
+
+def remove_stale(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+channel: Optional[UnixSocketChannel] = None
+
+
+def start_channel(directory: str = None) -> Optional[UnixSocketChannel]:
+    global channel
+    directory = directory or INVALIDATION_DIR
+    if directory and channel is None:
+        channel = UnixSocketChannel(directory)
+    return channel
+
+
+def stop_channel() -> None:
+    global channel
+    if channel is not None:
+        channel.close()
+        channel = None
+
+
+def publish(topic: str, items: list) -> None:
+    if channel is not None:
+        channel.publish(topic, items)
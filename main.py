@@ -1,24 +1,47 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from database import engine
-from model import Base
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from availability import AVAILABILITY_INDEX, load_availability_index
+from invalidation import start_channel, stop_channel
+from database import warm_pools
+from instrumentation import InstrumentationMiddleware
+from metrics import render
 from car_router import car_router
 from garage_router import garage_router
 from maintenance_router import maintenance_router
+from analytics_router import analytics_router
+from export_router import export_router
 from fastapi.middleware.cors import CORSMiddleware
 
-Base.metadata.create_all(engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_channel()
+    await warm_pools()
+    if AVAILABILITY_INDEX:
+        await run_in_threadpool(load_availability_index)
+    yield
+    stop_channel()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(car_router, prefix="/cars", tags=["Cars"])
 app.include_router(garage_router, prefix="/garages", tags=["Garages"])
 app.include_router(maintenance_router, prefix="/maintenance", tags=["Maintenances"])
+app.include_router(analytics_router, prefix="/analytics", tags=["Analytics"])
+app.include_router(export_router, prefix="/export", tags=["Export"])
+
+@app.get('/metrics', response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(render(), media_type='text/plain; version=0.0.4')
 
 
 origins = [
     "http://localhost:3000",
 ]
 
+app.add_middleware(InstrumentationMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -1,23 +1,42 @@
 from datetime import date
-from fastapi import APIRouter, HTTPException,Query
+from fastapi import APIRouter, Body, HTTPException,Query, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import List
-from dtos import CreateMaintenance, UpdateMaintenance, ResponseMaintenance, monthlyRequestsReport
-from maintenance_service import create_maintenance, get_maintenance, fetch_maintenances, update_maintenance, delete_maintenance, get_monthly_requests_report
+from dtos import CreateMaintenance, UpdateMaintenance, ResponseMaintenance, ResponseBulkResult, monthlyRequestsReport, garageMonthlyRequestsReport
+from etag import check_etag, etag_headers
+from serialization import trusted_response
+from garage_router import parse_ids
+from maintenance_service import create_maintenance, create_maintenances, get_maintenance_async, fetch_maintenances_async, stream_maintenances, update_maintenance, delete_maintenance, get_monthly_requests_report_async, get_monthly_requests_reports_async
 
 maintenance_router = APIRouter()
 
 @maintenance_router.get('/monthlyRequestsReport', response_model=List[monthlyRequestsReport])
-def get_maintenance_monthly_report(garageId: int = Query(...), startMonth: str = Query(..., regex=r'^\d{4}-\d{2}$'), endMonth: str = Query(..., regex=r'^\d{4}-\d{2}$')) -> List[monthlyRequestsReport]:
+async def get_maintenance_monthly_report(request: Request, response: Response, garageId: int = Query(...), startMonth: str = Query(None, regex=r'^\d{4}-\d{2}$'), endMonth: str = Query(None, regex=r'^\d{4}-\d{2}$'), lastMonths: int = Query(None, ge=1)) -> List[monthlyRequestsReport]:
+    not_modified = check_etag(request, response, 'garage', 'maintenance')
+    if not_modified:
+        return not_modified
     try:
-        return get_monthly_requests_report(garageId, startMonth, endMonth)
+        return await get_monthly_requests_report_async(garageId, startMonth, endMonth, lastMonths)
     except HTTPException as e:
         raise e
     except ValueError:
         raise HTTPException(status_code=404, detail='Garage not found')
 
+@maintenance_router.get('/monthlyRequestsReports', response_model=List[garageMonthlyRequestsReport])
+async def get_maintenances_monthly_report(request: Request, response: Response, garageIds: str = Query(...), startMonth: str = Query(None, pattern=r'^\d{4}-\d{2}$'), endMonth: str = Query(None, pattern=r'^\d{4}-\d{2}$'), lastMonths: int = Query(None, ge=1)) -> List[garageMonthlyRequestsReport]:
+    not_modified = check_etag(request, response, 'garage', 'maintenance')
+    if not_modified:
+        return not_modified
+    return await get_monthly_requests_reports_async(parse_ids(garageIds), startMonth, endMonth, lastMonths)
+
 @maintenance_router.get('/', response_model=list[ResponseMaintenance])
-def get_maintenances(carId: int = None, garageId: int = None, startDate: date = Query(None), endDate: date = Query(None)) -> list[ResponseMaintenance]:
-    return fetch_maintenances(carId, garageId, startDate, endDate)
+async def get_maintenances(request: Request, response: Response, carId: int = None, garageId: int = None, startDate: date = Query(None), endDate: date = Query(None), limit: int = Query(None, ge=1), after: int = Query(None), stream: bool = Query(False)) -> list[ResponseMaintenance]:
+    not_modified = check_etag(request, response, 'maintenance', 'car', 'garage')
+    if not_modified:
+        return not_modified
+    if stream:
+        return StreamingResponse(stream_maintenances(carId, garageId, startDate, endDate, limit, after), media_type='application/x-ndjson', headers=etag_headers(response))
+    return trusted_response(await fetch_maintenances_async(carId, garageId, startDate, endDate, limit, after), response)
 
 
 @maintenance_router.post('/', response_model=ResponseMaintenance)
@@ -27,10 +46,14 @@ def create_single_maintenance(request: CreateMaintenance):
     except ValueError:
         raise HTTPException(status_code=404, detail='Maintenance not created')
 
+@maintenance_router.post('/bulk', response_model=list[ResponseBulkResult])
+def create_bulk_maintenances(request: list = Body(...), batchSize: int = Query(1000, ge=1, le=10000)):
+    return create_maintenances(request, batchSize)
+
 @maintenance_router.get('/{id}', response_model=ResponseMaintenance)
-def get_single_maintenance(id: int):
+async def get_single_maintenance(id: int):
     try:
-        return get_maintenance(id)
+        return await get_maintenance_async(id)
     except ValueError:
         raise HTTPException(status_code=404, detail='Maintenance not found')
 
@@ -1,11 +1,18 @@
+from collections import Counter
 from datetime import datetime, date
-from typing import List
-from sqlalchemy import func
-from database import Session
-from dtos import CreateMaintenance, UpdateMaintenance, ResponseMaintenance, monthlyRequestsReport, YearMonth
-from garage_service import get_garage_by_id
-from model import Maintenance, car_garage, Car, Garage
-from sqlalchemy.orm import Session as ORMSession
+from typing import Callable, Iterator, List
+from pydantic import ValidationError
+import availability
+from cache import cache, bump_versions
+from sqlalchemy import Select, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession as AsyncORMSession
+from database import Session, AsyncSession, STREAM_CHUNK_SIZE
+from car_service import chunked
+from dtos import CreateMaintenance, UpdateMaintenance, ResponseMaintenance, ResponseBulkResult, monthlyRequestsReport, garageMonthlyRequestsReport, YearMonth
+from garage_service import get_garage_by_id, get_garage_by_id_async, map_found_garages, select_daily_loads, map_daily_loads, adjust_daily_load, adjust_occupancy, get_garage_occupancies, link_car_to_garage, unlink_car_from_garage
+from model import Maintenance, GarageDailyLoad, car_garage, Car, Garage
+from serialization import build, dumps, row_factory
+from sqlalchemy.orm import Session as ORMSession, joinedload
 from fastapi import HTTPException
 
 def get_maintenance_by_id(id: int, session: ORMSession) -> Maintenance:
@@ -14,6 +21,12 @@ def get_maintenance_by_id(id: int, session: ORMSession) -> Maintenance:
         raise HTTPException(status_code=404, detail='Maintenance not found')
     return maintenance
 
+async def get_maintenance_by_id_async(id: int, session: AsyncORMSession) -> Maintenance:
+    maintenance = await session.get(Maintenance, id, options=[joinedload(Maintenance.car), joinedload(Maintenance.garage)])
+    if maintenance is None:
+        raise HTTPException(status_code=404, detail='Maintenance not found')
+    return maintenance
+
 def create_maintenance(request: CreateMaintenance) -> ResponseMaintenance:
     scheduled_date_str = str(request.scheduledDate)
 
@@ -31,45 +44,178 @@ def create_maintenance(request: CreateMaintenance) -> ResponseMaintenance:
         session.add(new_maintenance)
         session.flush()
 
-        insertDb = insert(car_garage).values(carId=request.carId, garageId=request.garageId)
-        session.execute(insertDb)
+        link_car_to_garage(request.carId, request.garageId, session)
+        adjust_daily_load({(request.garageId, request.scheduledDate): 1}, session)
 
         session.commit()
+        availability.apply_loads({(request.garageId, request.scheduledDate): 1})
+        cache.invalidate('car', request.carId)
+        bump_versions('maintenance', 'car_garage')
         session.refresh(new_maintenance)
         return map_maintenance_to_response(new_maintenance)
 
+def create_maintenances(rows: list, batchSize: int = 1000) -> list[ResponseBulkResult]:
+    results = {}
+    requests = {}
+    for index, row in enumerate(rows):
+        try:
+            requests[index] = CreateMaintenance.model_validate(row)
+        except ValidationError as e:
+            results[index] = ResponseBulkResult(row=index, status='rejected', detail=str(e.errors()[0]['msg']))
+
+    with Session() as session:
+        carIds = {request.carId for request in requests.values()}
+        garageIds = {request.garageId for request in requests.values()}
+        garages = get_garage_occupancies(garageIds, session)
+        cars = set(session.scalars(select(Car.id).where(Car.id.in_(carIds))))
+        linked = set(session.execute(
+            select(car_garage.c.carId, car_garage.c.garageId).where(car_garage.c.carId.in_(carIds))
+        ).all()) if carIds else set()
+
+        loads = {}
+        if requests:
+            dates = [request.scheduledDate for request in requests.values()]
+            loads = map_daily_loads(session.execute(select_daily_loads(list(garages), min(dates), max(dates))))
+
+        accepted = {}
+        links = {}
+        for index, request in requests.items():
+            key = (request.garageId, request.scheduledDate)
+            pair = (request.carId, request.garageId)
+            garage = garages.get(request.garageId)
+            if request.carId not in cars:
+                detail = f"Car with id {request.carId} not found"
+            elif garage is None:
+                detail = f"Garage with id {request.garageId} not found"
+            elif loads.get(key, 0) >= garage['capacity']:
+                detail = f"Garage with id {request.garageId} is fully booked on {request.scheduledDate}"
+            else:
+                detail = None
+
+            if detail:
+                results[index] = ResponseBulkResult(row=index, status='rejected', detail=detail)
+                continue
+
+            if pair not in linked:
+                linked.add(pair)
+                links[pair] = {'carId': request.carId, 'garageId': request.garageId}
+            loads[key] = loads.get(key, 0) + 1
+            accepted[index] = request
+
+        if links:
+            session.execute(insert(car_garage), list(links.values()))
+            adjust_occupancy(Counter(garageId for _, garageId in links), session)
+
+        values = [
+            {
+                'serviceType': request.serviceType,
+                'scheduledDate': request.scheduledDate,
+                'carId': request.carId,
+                'garageId': request.garageId
+            }
+            for request in accepted.values()
+        ]
+        ids = [id for batch in chunked(values, batchSize) for id in insert_maintenances(batch, session)]
+        for (index, request), id in zip(accepted.items(), ids):
+            results[index] = ResponseBulkResult(row=index, status='created', id=id)
+
+        booked = Counter((request.garageId, request.scheduledDate) for request in accepted.values())
+        adjust_daily_load(booked, session)
+        session.commit()
+
+    availability.apply_loads(booked)
+    cache.invalidate('car', *{request.carId for request in accepted.values()})
+    bump_versions('maintenance', 'car_garage')
+    return [results[index] for index in sorted(results)]
+
+def insert_maintenances(values: list[dict], session: ORMSession) -> list[int]:
+    dialect = session.get_bind().dialect
+    if dialect.insert_executemany_returning_sort_by_parameter_order:
+        return list(session.scalars(insert(Maintenance).returning(Maintenance.id, sort_by_parameter_order=True), values))
+    return [session.execute(insert(Maintenance).values(**row)).inserted_primary_key[0] for row in values]
+
 def get_maintenance(id: int) -> ResponseMaintenance:
+    cached, generation = cache.get('maintenance', id, ResponseMaintenance)
+    if cached:
+        return cached
     with Session() as session:
         maintenance = get_maintenance_by_id(id, session)
-        return map_maintenance_to_response(maintenance)
+        response = map_maintenance_to_response(maintenance)
+    cache.set('maintenance', id, response, generation)
+    return response
+
+async def get_maintenance_async(id: int) -> ResponseMaintenance:
+    cached, generation = await cache.get_async('maintenance', id, ResponseMaintenance)
+    if cached:
+        return cached
+    async with AsyncSession() as session:
+        maintenance = await get_maintenance_by_id_async(id, session)
+        response = map_maintenance_to_response(maintenance)
+    await cache.set_async('maintenance', id, response, generation)
+    return response
+
+def fetch_maintenances(carId: int = None, garageId: int = None, startDate: date = None, endDate: date = None, limit: int = None, after: int = None) -> list[ResponseMaintenance]:
+    with Session() as session:
+        rows = session.execute(select_maintenances(carId, garageId, startDate, endDate, limit, after)).all()
+        factory = row_factory()
+        return [map_maintenance_row_to_response(row, factory) for row in rows]
 
-def fetch_maintenances(carId: int = None, garageId: int = None, startDate: date = None, endDate: date = None) -> list[ResponseMaintenance]:
+async def fetch_maintenances_async(carId: int = None, garageId: int = None, startDate: date = None, endDate: date = None, limit: int = None, after: int = None) -> list[ResponseMaintenance]:
+    async with AsyncSession() as session:
+        rows = (await session.execute(select_maintenances(carId, garageId, startDate, endDate, limit, after))).all()
+        factory = row_factory()
+        return [map_maintenance_row_to_response(row, factory) for row in rows]
+
+def stream_maintenances(carId: int = None, garageId: int = None, startDate: date = None, endDate: date = None, limit: int = None, after: int = None) -> Iterator[bytes]:
     with Session() as session:
-        query = session.query(Maintenance)
+        statement = select_maintenances(carId, garageId, startDate, endDate, limit, after)
+        factory = row_factory()
+        for row in session.execute(statement.execution_options(yield_per=STREAM_CHUNK_SIZE)):
+            yield dumps(map_maintenance_row_to_response(row, factory)) + b'\n'
+
+def select_maintenances(carId: int = None, garageId: int = None, startDate: date = None, endDate: date = None, limit: int = None, after: int = None) -> Select:
+    statement = select(
+        Maintenance.id,
+        Maintenance.carId,
+        Car.make,
+        Car.model,
+        Maintenance.serviceType,
+        Maintenance.scheduledDate,
+        Maintenance.garageId,
+        Garage.name
+    ).outerjoin(
+        Car, Car.id == Maintenance.carId
+    ).outerjoin(
+        Garage, Garage.id == Maintenance.garageId
+    )
 
-        if carId is not None:
-            query = query.filter(Maintenance.carId == carId)
+    if carId is not None:
+        statement = statement.where(Maintenance.carId == carId)
 
-        if garageId is not None:
-            query = query.filter(Maintenance.garageId == garageId)
+    if garageId is not None:
+        statement = statement.where(Maintenance.garageId == garageId)
 
-        if startDate is not None:
-            query = query.filter(Maintenance.scheduledDate >= startDate)
+    if startDate is not None:
+        statement = statement.where(Maintenance.scheduledDate >= startDate)
 
-        if endDate is not None:
-            query = query.filter(Maintenance.scheduledDate <= endDate)
+    if endDate is not None:
+        statement = statement.where(Maintenance.scheduledDate <= endDate)
 
-        maintenances = query.all()
-        return [map_maintenance_to_response(maintenance) for maintenance in maintenances]
+    if after is not None:
+        statement = statement.where(Maintenance.id > after)
 
-from sqlalchemy import delete, insert
+    statement = statement.order_by(Maintenance.id)
+    if limit:
+        statement = statement.limit(limit)
+    return statement
 
 def update_maintenance(id: int, request: UpdateMaintenance) -> ResponseMaintenance:
     with Session() as session:
-        maintenance = get_maintenance_by_id(id, session)
-
-        old_car = session.query(Car).filter(Car.id == maintenance.carId).first()
-        old_garage = session.query(Garage).filter(Garage.id == maintenance.garageId).first()
+        current = session.execute(
+            select(Maintenance.carId, Maintenance.garageId, Maintenance.scheduledDate).where(Maintenance.id == id)
+        ).first()
+        if current is None:
+            raise HTTPException(status_code=404, detail='Maintenance not found')
 
         scheduled_date_str = str(request.scheduledDate)
 
@@ -82,64 +228,52 @@ def update_maintenance(id: int, request: UpdateMaintenance) -> ResponseMaintenan
         if not str(request.garageId).isdigit():
             raise HTTPException(status_code=400, detail="Garage ID should contain digits only")
 
-        maintenance.serviceType = request.serviceType
-        maintenance.scheduledDate = request.scheduledDate
-        maintenance.carId = request.carId
-        maintenance.garageId = request.garageId
-
-        deleteDb = delete(car_garage).where(
-            car_garage.c.carId == old_car.id,
-            car_garage.c.garageId == old_garage.id
+        session.execute(
+            update(Maintenance).where(Maintenance.id == id).values(
+                serviceType=request.serviceType,
+                scheduledDate=request.scheduledDate,
+                carId=request.carId,
+                garageId=request.garageId
+            )
         )
-        session.execute(deleteDb)
 
-        insertDb = insert(car_garage).values(carId=request.carId, garageId=request.garageId)
-        session.execute(insertDb)
+        if (current.carId, current.garageId) != (request.carId, request.garageId):
+            unlink_car_from_garage(current.carId, current.garageId, session)
+            link_car_to_garage(request.carId, request.garageId, session)
 
+        loads = Counter({(current.garageId, current.scheduledDate): -1})
+        loads[(request.garageId, request.scheduledDate)] += 1
+        adjust_daily_load(loads, session)
+
+        row = session.execute(select_maintenances().where(Maintenance.id == id)).one()
         session.commit()
-        session.refresh(maintenance)
-
-        new_car = session.query(Car).filter(Car.id == maintenance.carId).first()
-        new_garage = session.query(Garage).filter(Garage.id == maintenance.garageId).first()
-
-        return ResponseMaintenance(
-            id=maintenance.id,
-            carId=maintenance.carId,
-            carName=f"{new_car.make} {new_car.model}" if new_car else None,
-            serviceType=maintenance.serviceType,
-            scheduledDate=maintenance.scheduledDate,
-            garageId=maintenance.garageId,
-            garageName=new_garage.name if new_garage else None
-        )
+
+    availability.apply_loads(loads)
+    cache.invalidate('maintenance', id)
+    cache.invalidate('car', current.carId, request.carId)
+    bump_versions('maintenance', 'car_garage')
+    return map_maintenance_row_to_response(row)
 
 def delete_maintenance(id: int) -> ResponseMaintenance:
     with Session() as session:
-        maintenance = get_maintenance_by_id(id, session)
-
-        car = session.query(Car).filter(Car.id == maintenance.carId).first()
-        garage = session.query(Garage).filter(Garage.id == maintenance.garageId).first()
-
-        deleteDb = delete(car_garage).where(
-            car_garage.c.carId == maintenance.carId,
-            car_garage.c.garageId == maintenance.garageId
-        )
-        session.execute(deleteDb)
+        row = session.execute(select_maintenances().where(Maintenance.id == id)).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail='Maintenance not found')
 
-        session.delete(maintenance)
+        unlink_car_from_garage(row.carId, row.garageId, session)
+        adjust_daily_load({(row.garageId, row.scheduledDate): -1}, session)
+        session.execute(delete(Maintenance).where(Maintenance.id == id))
         session.commit()
 
-        return ResponseMaintenance(
-            id=maintenance.id,
-            carId=maintenance.carId,
-            carName=f"{car.make} {car.model}" if car else None,
-            serviceType=maintenance.serviceType,
-            scheduledDate=maintenance.scheduledDate,
-            garageId=maintenance.garageId,
-            garageName=garage.name if garage else None
-        )
+    availability.apply_loads({(row.garageId, row.scheduledDate): -1})
+    cache.invalidate('maintenance', id)
+    cache.invalidate('car', row.carId)
+    bump_versions('maintenance', 'car_garage')
+    return map_maintenance_row_to_response(row)
 
-def map_maintenance_to_response(maintenance: Maintenance) -> ResponseMaintenance:
-    return ResponseMaintenance(
+def map_maintenance_to_response(maintenance: Maintenance, factory: Callable = build) -> ResponseMaintenance:
+    return factory(
+        ResponseMaintenance,
         id=maintenance.id,
         carId=maintenance.carId,
         carName=maintenance.car.make + ' ' + maintenance.car.model,
@@ -149,6 +283,18 @@ def map_maintenance_to_response(maintenance: Maintenance) -> ResponseMaintenance
         garageName=maintenance.garage.name
     )
 
+def map_maintenance_row_to_response(row, factory: Callable = build) -> ResponseMaintenance:
+    return factory(
+        ResponseMaintenance,
+        id=row.id,
+        carId=row.carId,
+        carName=f"{row.make} {row.model}" if row.make is not None else None,
+        serviceType=row.serviceType,
+        scheduledDate=row.scheduledDate,
+        garageId=row.garageId,
+        garageName=row.name
+    )
+
 def map_request_to_maintenance(request: CreateMaintenance) -> Maintenance:
     return Maintenance(
         serviceType=request.serviceType,
@@ -158,36 +304,87 @@ def map_request_to_maintenance(request: CreateMaintenance) -> Maintenance:
     )
 
 
-def get_monthly_requests_report(garageId: int, startDate: str, endDate: str) -> List[monthlyRequestsReport]:
+def get_monthly_requests_report(garageId: int, startDate: str = None, endDate: str = None, lastMonths: int = None) -> List[monthlyRequestsReport]:
+    start_month, end_month = resolve_month_range(startDate, endDate, lastMonths)
     with Session() as session:
-        garage = get_garage_by_id(garageId, session)
-        if not garage:
-            raise HTTPException(status_code=404, detail='Garage not found')
-
-        report = []
-        start_date = date.fromisoformat(startDate + '-01')
-        end_date = date.fromisoformat(endDate + '-01')
-
-        current_date = start_date
-
-        while current_date <= end_date:
-            month_start = current_date.replace(day=1)
-            if current_date.month == 12:
-                month_end = current_date.replace(year=current_date.year + 1, month=1)
-            else:
-                month_end = current_date.replace(month=current_date.month + 1)
-
-            requests = session.query(func.count(Maintenance.id)).filter(
-                Maintenance.garageId == garageId,
-                Maintenance.scheduledDate >= month_start,
-                Maintenance.scheduledDate < month_end
-            ).scalar()
-
-            report.append(monthlyRequestsReport(
-                yearMonth=YearMonth(year=current_date.year, monthValue=current_date.month),
-                requests=requests
-            ))
-
-            current_date = month_end
+        get_garage_by_id(garageId, session)
+        counts = map_monthly_counts(session.execute(select_monthly_counts([garageId], start_month, end_month)))
+        return build_monthly_requests_report(garageId, counts, start_month, end_month)
+
+async def get_monthly_requests_report_async(garageId: int, startDate: str = None, endDate: str = None, lastMonths: int = None) -> List[monthlyRequestsReport]:
+    start_month, end_month = resolve_month_range(startDate, endDate, lastMonths)
+    async with AsyncSession() as session:
+        await get_garage_by_id_async(garageId, session)
+        counts = map_monthly_counts(await session.execute(select_monthly_counts([garageId], start_month, end_month)))
+        return build_monthly_requests_report(garageId, counts, start_month, end_month)
+
+def get_monthly_requests_reports(garageIds: List[int], startDate: str = None, endDate: str = None, lastMonths: int = None) -> List[garageMonthlyRequestsReport]:
+    start_month, end_month = resolve_month_range(startDate, endDate, lastMonths)
+    with Session() as session:
+        map_found_garages(session.scalars(select(Garage).where(Garage.id.in_(garageIds))), garageIds)
+        counts = map_monthly_counts(session.execute(select_monthly_counts(garageIds, start_month, end_month)))
+        return build_monthly_requests_reports(garageIds, counts, start_month, end_month)
+
+async def get_monthly_requests_reports_async(garageIds: List[int], startDate: str = None, endDate: str = None, lastMonths: int = None) -> List[garageMonthlyRequestsReport]:
+    start_month, end_month = resolve_month_range(startDate, endDate, lastMonths)
+    async with AsyncSession() as session:
+        map_found_garages(await session.scalars(select(Garage).where(Garage.id.in_(garageIds))), garageIds)
+        counts = map_monthly_counts(await session.execute(select_monthly_counts(garageIds, start_month, end_month)))
+        return build_monthly_requests_reports(garageIds, counts, start_month, end_month)
+
+def resolve_month_range(startDate: str = None, endDate: str = None, lastMonths: int = None) -> tuple[date, date]:
+    if lastMonths is not None:
+        if lastMonths < 1:
+            raise HTTPException(status_code=400, detail="lastMonths should be a positive number")
+        end_month = date.today().replace(day=1)
+        return add_months(end_month, 1 - lastMonths), end_month
+
+    if not startDate or not endDate:
+        raise HTTPException(status_code=400, detail="Either startMonth and endMonth or lastMonths should be provided")
 
-        return report
+    try:
+        return date.fromisoformat(startDate + '-01'), date.fromisoformat(endDate + '-01')
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid month format")
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def select_monthly_counts(garageIds: List[int], start_month: date, end_month: date) -> Select:
+    year = func.extract('year', GarageDailyLoad.date)
+    month = func.extract('month', GarageDailyLoad.date)
+    return select(
+        GarageDailyLoad.garageId,
+        year,
+        month,
+        func.sum(GarageDailyLoad.requests)
+    ).where(
+        GarageDailyLoad.garageId.in_(garageIds),
+        GarageDailyLoad.date >= start_month,
+        GarageDailyLoad.date < add_months(end_month, 1)
+    ).group_by(GarageDailyLoad.garageId, year, month)
+
+def map_monthly_counts(rows) -> dict[tuple[int, int, int], int]:
+    return {(garageId, int(year), int(month)): requests for garageId, year, month, requests in rows}
+
+def build_monthly_requests_reports(garageIds: List[int], counts: dict[tuple[int, int, int], int], start_month: date, end_month: date) -> List[garageMonthlyRequestsReport]:
+    return [
+        garageMonthlyRequestsReport(
+            garageId=garageId,
+            report=build_monthly_requests_report(garageId, counts, start_month, end_month)
+        )
+        for garageId in dict.fromkeys(garageIds)
+    ]
+
+def build_monthly_requests_report(garageId: int, counts: dict[tuple[int, int, int], int], start_month: date, end_month: date) -> List[monthlyRequestsReport]:
+    report = []
+    current_date = start_month
+    while current_date <= end_month:
+        report.append(monthlyRequestsReport(
+            yearMonth=YearMonth(year=current_date.year, monthValue=current_date.month),
+            requests=counts.get((garageId, current_date.year, current_date.month), 0)
+        ))
+        current_date = add_months(current_date, 1)
+
+    return report
@@ -0,0 +1,76 @@
+import argparse
+import sys
+from datetime import datetime
+from cache import TABLES
+from export_service import EXPORT_MEDIA_TYPES, EXPORT_TABLES, check_export_format, get_export_watermark, stream_export
+from garage_service import reconcile_occupancy, rebuild_daily_load
+from invalidation import publish, start_channel, stop_channel
+from fastapi import HTTPException
+
+
+def announce(tables: list[str], reload_availability: bool = False) -> None:
+    if start_channel() is None:
+        print('INVALIDATION_DIR is not set, running serve.py workers keep their ETags and availability index until restarted', file=sys.stderr)
+        return
+    try:
+        if reload_availability:
+            publish('availability.reload', tables)
+        publish('versions', tables)
+    finally:
+        stop_channel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Car management maintenance commands')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('reconcile-occupancy', help='Recompute garage occupancy counters from car_garage')
+    commands.add_parser('rebuild-daily-load', help='Rebuild the garage_daily_load rollup from maintenance')
+    commands.add_parser(
+        'invalidate',
+        help='Tell running serve.py workers that data changed outside the API',
+        description='Tell the serve.py workers sharing INVALIDATION_DIR that data changed outside the API, e.g. after '
+                    'a data migration or manual SQL: ETags change and the availability index is reloaded. Cached '
+                    'entities expire after CACHE_TTL.'
+    )
+    export = commands.add_parser(
+        'export',
+        help='Stream a table out as CSV, Arrow IPC or Parquet',
+        description='Stream a table out as CSV, Arrow IPC or Parquet. With --after and/or --updated-since only rows '
+                    'inserted or updated since the previous export are written. Deleted rows are not reported by '
+                    'either watermark; run a full export to pick up deletes.'
+    )
+    export.add_argument('entity', choices=list(EXPORT_TABLES))
+    export.add_argument('--format', choices=list(EXPORT_MEDIA_TYPES), default='csv')
+    export.add_argument('--output', help='Output file, defaults to stdout')
+    export.add_argument('--after', type=int, help='Export rows with an id above this watermark, or matching --updated-since')
+    export.add_argument('--updated-since', type=datetime.fromisoformat, help='Export rows updated at or after this ISO timestamp, or matching --after')
+
+    args = parser.parse_args()
+    if args.command == 'reconcile-occupancy':
+        drifted = reconcile_occupancy()
+        announce(['garage', 'car_garage'])
+        print(f'Reconciled garage occupancy, {drifted} garage(s) corrected')
+    elif args.command == 'rebuild-daily-load':
+        rows = rebuild_daily_load()
+        announce(['maintenance'], reload_availability=True)
+        print(f'Rebuilt garage daily load, {rows} row(s) written')
+    elif args.command == 'invalidate':
+        announce(list(TABLES), reload_availability=True)
+    elif args.command == 'export':
+        try:
+            check_export_format(args.format)
+        except HTTPException as e:
+            sys.exit(e.detail)
+        watermark = get_export_watermark(args.entity, args.after, args.updated_since)
+        output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in stream_export(args.entity, args.format, args.after, args.updated_since):
+                output.write(chunk)
+        finally:
+            if args.output:
+                output.close()
+        print(f"Exported {args.entity}, next watermark: --after {watermark['maxId']} --updated-since {watermark['updatedAt']}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
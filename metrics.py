@@ -0,0 +1,94 @@
+import threading
+from typing import Callable
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_registry = []
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self.values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        return [(self.name, key, value) for key, value in list(self.values.items())]
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, collect: Callable[[], dict[tuple, float]] = None):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self.values = {}
+        _registry.append(self)
+
+    def set(self, value: float, **labels) -> None:
+        with _lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        values = self.collect() if self.collect else dict(self.values)
+        return [(self.name, key, value) for key, value in values.items()]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.values = {}
+        _registry.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            series = self.values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        samples = []
+        for key, (counts, total, count) in list(self.values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                samples.append((f'{self.name}_bucket', key + (('le', bound),), bucket_count))
+            samples.append((f'{self.name}_bucket', key + (('le', '+Inf'),), count))
+            samples.append((f'{self.name}_sum', key, total))
+            samples.append((f'{self.name}_count', key, count))
+        return samples
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
@@ -1,4 +1,4 @@
-from sqlalchemy import Table, Column, Integer, String, Date, ForeignKey
+from sqlalchemy import Table, Column, Integer, String, Date, DateTime, ForeignKey, Index, func
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -7,35 +7,61 @@ car_garage = Table(
     'car_garage',
     Base.metadata,
     Column('carId', Integer, ForeignKey('car.id', ondelete='CASCADE'), primary_key=True),
-    Column('garageId', Integer, ForeignKey('garage.id', ondelete='CASCADE'), primary_key=True)
+    Column('garageId', Integer, ForeignKey('garage.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_car_garage_garageId_carId', 'garageId', 'carId')
 )
 
 class Garage(Base):
     __tablename__ = 'garage'
+    __table_args__ = (
+        Index('ix_garage_city', 'city'),
+        Index('ix_garage_updatedAt', 'updatedAt'),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(255), nullable=False)
     location = Column(String(255), nullable=False)
     city = Column(String(255), nullable=False)
     capacity = Column(Integer, nullable=False)
+    occupancy = Column(Integer, nullable=False, default=0, server_default='0')
+    updatedAt = Column(DateTime, nullable=True, default=func.now(), onupdate=func.now())
     cars = relationship('Car', secondary=car_garage, back_populates='garages')
     maintenances = relationship('Maintenance', back_populates='garage')
 
 class Car(Base):
     __tablename__ = 'car'
+    __table_args__ = (
+        Index('ix_car_make_productionYear', 'make', 'productionYear'),
+        Index('ix_car_productionYear', 'productionYear'),
+        Index('ix_car_updatedAt', 'updatedAt'),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     make = Column(String(255), nullable=False)
     model = Column(String(255), nullable=False)
     productionYear = Column(Integer, nullable=False)
     licensePlate = Column(String(20), nullable=False, unique=True)
+    updatedAt = Column(DateTime, nullable=True, default=func.now(), onupdate=func.now())
     garages = relationship('Garage', secondary=car_garage, back_populates='cars')
     maintenances = relationship('Maintenance', back_populates='car')
 
 class Maintenance(Base):
     __tablename__ = 'maintenance'
+    __table_args__ = (
+        Index('ix_maintenance_garageId_scheduledDate', 'garageId', 'scheduledDate'),
+        Index('ix_maintenance_carId_scheduledDate', 'carId', 'scheduledDate'),
+        Index('ix_maintenance_updatedAt', 'updatedAt'),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     serviceType = Column(String(255), nullable=False)
     scheduledDate = Column(Date, nullable=True)
+    createdAt = Column(DateTime, nullable=True, default=func.now())
+    updatedAt = Column(DateTime, nullable=True, default=func.now(), onupdate=func.now())
     carId = Column(Integer, ForeignKey('car.id', ondelete='SET NULL'), nullable=True)
     garageId = Column(Integer, ForeignKey('garage.id', ondelete='SET NULL'), nullable=True)
     car = relationship('Car', back_populates='maintenances')
     garage = relationship('Garage', back_populates='maintenances')
+
+class GarageDailyLoad(Base):
+    __tablename__ = 'garage_daily_load'
+    garageId = Column(Integer, ForeignKey('garage.id', ondelete='CASCADE'), primary_key=True)
+    date = Column(Date, primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,41 @@
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+from typing import Callable, Type, TypeVar
+from database import env_bool
+from etag import etag_headers
+
+T = TypeVar('T', bound=BaseModel)
+
+TRUSTED_OUTPUT = env_bool('TRUSTED_OUTPUT', False)
+
+
+def build(response_model: Type[T], /, **values) -> T:
+    if TRUSTED_OUTPUT:
+        return response_model.model_construct(**values)
+    return response_model(**values)
+
+
+def build_row(response_model: Type[BaseModel], /, **values) -> dict:
+    return {name: values.get(name, field.default) for name, field in response_model.model_fields.items()}
+
+
+def row_factory() -> Callable:
+    return build_row if TRUSTED_OUTPUT else build
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=vars)
+
+
+class TrustedJSONResponse(Response):
+    media_type = 'application/json'
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def trusted_response(content, response: Response):
+    if not TRUSTED_OUTPUT:
+        return content
+    return TrustedJSONResponse(content, headers=etag_headers(response))
@@ -0,0 +1,104 @@
+import argparse
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import traceback
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(config, sock: socket.socket) -> None:
+    import uvicorn
+    from database import dispose_after_fork
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    dispose_after_fork()
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(config, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(config, sock)
+        except BaseException:
+            traceback.print_exc()
+            os._exit(1)
+        os._exit(0)
+    return pid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Serve the API from several preloaded worker processes',
+        epilog='The workers share table versions, so ETags are on by default (ETAGS=auto). Writes made outside these '
+               'workers change responses without changing ETags: set INVALIDATION_DIR to a fixed directory and run '
+               'manage.py with the same value (its commands announce their writes, manage.py invalidate covers data '
+               'migrations and manual SQL), or set ETAGS=off when the database is written by other hosts.'
+    )
+    parser.add_argument('--host', default=os.getenv('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', 8000)))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1)))
+    parser.add_argument('--log-level', default='info')
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit('serve requires uvicorn, install it with: pip install uvicorn')
+
+    directory = os.getenv('INVALIDATION_DIR')
+    created = not directory
+    if created:
+        directory = tempfile.mkdtemp(prefix='car-management-')
+        os.environ['INVALIDATION_DIR'] = directory
+    else:
+        os.makedirs(directory, exist_ok=True)
+
+    import cache
+    cache.share_versions()
+    from main import app
+
+    sock = bind_socket(args.host, args.port)
+    config = uvicorn.Config(app, lifespan='on', log_level=args.log_level)
+    workers = {spawn(config, sock) for _ in range(args.workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    print(f'Serving on http://{args.host}:{args.port} with {args.workers} workers', file=sys.stderr)
+
+    try:
+        while workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            workers.discard(pid)
+            if not stopping and os.waitstatus_to_exitcode(status) != 0:
+                workers.add(spawn(config, sock))
+    finally:
+        sock.close()
+        if created:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()